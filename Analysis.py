@@ -0,0 +1,1009 @@
+import functools
+import numpy as np
+import pandas as pd
+from scipy import fft as spFft
+from scipy import interpolate
+import scipy.signal as spSig
+from scipy import spatial
+
+
+################################################################
+# SPECTRAL ANALYSIS
+
+class SpectralEngine():
+    '''
+    Welch estimates of auto- and cross-spectra (density scaling, Hann window,
+    constant detrending per segment, as in scipy.signal.csd).
+    Every signal is segmented and FFTed exactly once;
+    all spectra are built from these FFTs
+    '''
+
+    def __init__(self, fs, nperseg=2**10, noverlap=2**9, window='hann'):
+        self.fs = fs
+        self.nperseg = nperseg
+        self.noverlap = noverlap
+        self.step = nperseg - noverlap
+
+        self.window = spSig.get_window(window, nperseg)
+        self.scale = 1./(fs*np.sum(self.window**2))
+        self.freq = np.fft.rfftfreq(nperseg, 1./fs)
+
+
+    def segmentNum(self, length):
+        return (max(length, self.nperseg) - self.nperseg)//self.step + 1
+
+
+    def segments(self, signal, length=None):
+        '''
+        function returns the detrended segments (segments x nperseg) of the signal;
+        signals shorter than length (at least nperseg) are zero-padded
+        '''
+
+        signal = np.asarray(signal, dtype=float)
+        if length is None:
+            length = signal.shape[0]
+        length = max(length, self.nperseg)
+        if signal.shape[0] < length:
+            signal = np.concatenate((signal, np.zeros(length - signal.shape[0])))
+
+        segments = np.lib.stride_tricks.sliding_window_view(signal, self.nperseg)[::self.step]
+        return segments - np.mean(segments, axis=1, keepdims=True)
+
+
+    def segmentFFTs(self, segments):
+        return np.fft.rfft(segments*self.window, axis=-1)
+
+
+    def crossSpectra(self, signals):
+        '''
+        function calculates the full cross-spectral matrix for
+        the dictionary of (equally sampled) signals; signals of different
+        lengths are zero-padded to the longest one
+        '''
+
+        names = list(signals.keys())
+        length = max([len(signals[name]) for name in names])
+
+        ffts = np.stack([self.segmentFFTs(self.segments(signals[name], length)) for name in names])
+
+        # average over segments
+        S = np.einsum('isf,jsf->ijf', np.conj(ffts), ffts)/ffts.shape[1]*self.scale
+
+        # one-sided spectra
+        if self.nperseg % 2:
+            S[..., 1:] *= 2
+        else:
+            S[..., 1:-1] *= 2
+
+        return CrossSpectra(self.freq, names, S)
+
+
+    def batchCoherence(self, trialSignals, pairs, chunkSize=64):
+        '''
+        function calculates the coherence of all signal pairs for a list
+        of trials (dictionaries of signals) at once: the segments of all
+        trials are FFTed in one go and averaged per trial.
+        Pairs with a signal that is missing (None) in a trial are NaN
+
+        returns freq and a dictionary pair -> coherence (trials x freq)
+        '''
+
+        names = sorted(set([name for pair in pairs for name in pair]))
+        coherence = {pair: np.full((len(trialSignals), self.freq.shape[0]), np.nan) for pair in pairs}
+
+        for chunkStart in range(0, len(trialSignals), chunkSize):
+            chunk = trialSignals[chunkStart:chunkStart+chunkSize]
+
+            # segment all signals of all trials in chunk
+            segments = {name: list() for name in names}
+            available = {name: list() for name in names}
+            segNums = list()
+            for trial in chunk:
+                length = max([len(trial[name]) for name in names if trial.get(name) is not None])
+                segNums.append(self.segmentNum(length))
+                for name in names:
+                    signal = trial.get(name)
+                    available[name].append(signal is not None)
+                    if signal is None:
+                        signal = np.zeros(length)
+                    segments[name].append(self.segments(signal, length))
+
+            # FFT of all segments and average per trial
+            offsets = np.cumsum([0] + segNums[:-1])
+            ffts = {name: self.segmentFFTs(np.concatenate(segments[name])) for name in names}
+            auto = {name: np.add.reduceat(np.abs(ffts[name])**2, offsets, axis=0) for name in names}
+
+            for a, b in pairs:
+                cross = np.add.reduceat(np.conj(ffts[a])*ffts[b], offsets, axis=0)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    coh = np.abs(cross)**2/(auto[a]*auto[b])
+                coh[~(np.asarray(available[a]) & np.asarray(available[b]))] = np.nan
+                coherence[(a, b)][chunkStart:chunkStart+len(chunk)] = coh
+
+        return self.freq, coherence
+
+
+class CrossSpectra():
+
+    def __init__(self, freq, names, S):
+        self.freq = freq
+        self.names = names
+        self.S = S
+
+
+    def spectrum(self, a, b=None):
+        if b is None:
+            b = a
+        return self.S[self.names.index(a), self.names.index(b)]
+
+
+    def coherence(self, a, b):
+        return np.abs(self.spectrum(a, b))**2/(np.abs(self.spectrum(a))*np.abs(self.spectrum(b)))
+
+
+@functools.lru_cache(maxsize=32)
+def psdFrequencies(Fs, n, nperseg=2**14):
+    '''
+    function returns the first n frequencies of a Welch PSD (segment length nperseg)
+    of a signal sampled at Fs; the axis is shared by all signals with the same Fs
+    and must not be modified
+    '''
+
+    freq = np.fft.rfftfreq(nperseg, 1./Fs)[:n]
+    freq.flags.writeable = False
+    return freq
+
+
+################################################################
+# DERIVED RESULTS
+# peak times and PSD frequencies are not stored; they are derived from the stored
+# peak indices and PSD, the sampling rate ('<alias>Dim') and the PSD segment length
+
+def derivedPeakTimes(peakIdcs, Fs):
+    '''
+    function returns the times of the peaks at indices peakIdcs
+    of a signal sampled at Fs (or None if they cannot be derived)
+    '''
+
+    if not isinstance(peakIdcs, (list, np.ndarray)) or Fs is None or not Fs > 0:
+        return None
+
+    return np.asarray(peakIdcs)/Fs
+
+
+def derivedPSDFrequencies(PSD, Fs, nperseg):
+    '''
+    function returns the (shared) frequency axis of the PSD of a signal
+    sampled at Fs with segment length nperseg (or None if it cannot be derived)
+    '''
+
+    if not isinstance(PSD, (list, np.ndarray)) or Fs is None or not Fs > 0 or nperseg is None or not nperseg > 0:
+        return None
+
+    return psdFrequencies(float(Fs), len(PSD), nperseg=int(nperseg))
+
+
+# stored column suffix: derived column suffix, function, suffixes of the further columns it takes
+derivedColumns = {
+    'PeakIdcs': ('PeakTimes', derivedPeakTimes, []),
+    'PSD': ('PSDfreq', derivedPSDFrequencies, ['PSDnperseg'])
+}
+
+
+def deriveColumn(Df, alias, suffix):
+    '''
+    function returns the values derived from the column '<alias><suffix>' of Df
+    (see derivedColumns; None for rows they cannot be derived for)
+    '''
+
+    derivedSuffix, derive, argSuffixes = derivedColumns[suffix]
+
+    argColumns = ['%sDim' % alias] + ['%s%s' % (alias, argSuffix) for argSuffix in argSuffixes]
+    args = [Df[column].values if column in Df.columns else [None]*Df.shape[0] for column in argColumns]
+
+    return [derive(stored, *rowArgs) for stored, *rowArgs in zip(Df['%s%s' % (alias, suffix)].values, *args)]
+
+
+def deriveResults(Df):
+    '''
+    function adds the derived columns '<alias>PeakTimes' and '<alias>PSDfreq'
+    for every column '<alias>PeakIdcs' and '<alias>PSD' of Df;
+    rows they cannot be derived for keep their previous derived values
+    '''
+
+    for name in list(map(str, Df.columns)):
+        for suffix, (derivedSuffix, derive, argSuffixes) in derivedColumns.items():
+            alias = name[:-len(suffix)]
+            if not name.endswith(suffix) or '%sDim' % alias not in Df.columns:
+                continue
+
+            derivedColumn = '%s%s' % (alias, derivedSuffix)
+            values = deriveColumn(Df, alias, suffix)
+            if derivedColumn in Df.columns:
+                values = [new if new is not None else old for new, old in zip(values, Df[derivedColumn].values)]
+            Df[derivedColumn] = pd.Series(values, index=Df.index, dtype=object)
+
+    return Df
+
+
+def compactResults(Df):
+    '''
+    function returns Df without the derived columns; values that cannot be
+    derived again (e.g. PSD frequencies of rows without PSD segment length)
+    are kept
+    '''
+
+    Df = Df.copy()
+    for name in list(map(str, Df.columns)):
+        for suffix, (derivedSuffix, derive, argSuffixes) in derivedColumns.items():
+            alias = name[:-len(derivedSuffix)]
+            if not name.endswith(derivedSuffix) or '%s%s' % (alias, suffix) not in Df.columns:
+                continue
+
+            keep = [
+                derived is None and isinstance(value, (list, np.ndarray))
+                for value, derived in zip(Df[name].values, deriveColumn(Df, alias, suffix))
+            ]
+            if not any(keep):
+                Df = Df.drop(columns=name)
+            else:
+                Df[name] = pd.Series(
+                    [value if isKept else None for value, isKept in zip(Df[name].values, keep)],
+                    index=Df.index, dtype=object
+                )
+
+    return Df
+
+
+################################################################
+# SPIKE-TRIGGERED AVERAGE
+
+def staWindows(spikes, n, Fs, staTime):
+    '''
+    function returns the sample indices of the STA windows (spikes x samples)
+    for all spikes with a complete window in a signal of n samples;
+    each window ends with the sample of the spike
+    '''
+
+    staRange = int(round(staTime*Fs))
+    tIdcs = np.round(np.asarray(spikes)*Fs).astype(int)
+    tIdcs = tIdcs[(tIdcs > staRange) & (tIdcs < n)]
+
+    return tIdcs[:,None] + np.arange(-staRange+1, 1)[None,:]
+
+
+def spikeTriggeredSums(spikes, signals, Fs, staTime):
+    '''
+    function sums the STA windows of all valid spikes for a dictionary of
+    signals (sampled at Fs) in one vectorized step per signal length
+    returns dictionaries name -> window sum and name -> number of spikes
+    '''
+
+    sums = dict()
+    counts = dict()
+    windows = dict()
+    for name, signal in signals.items():
+        if signal is None:
+            continue
+
+        n = signal.shape[0]
+        if n not in windows:
+            windows[n] = staWindows(spikes, n, Fs, staTime)
+
+        sums[name] = np.sum(signal[windows[n]], axis=0)
+        counts[name] = windows[n].shape[0]
+
+    return sums, counts
+
+
+def spikeTriggeredAverage(spikes, signals, Fs, staTime):
+    '''
+    function returns the STAs (name -> STA) of a dictionary of signals;
+    STAs of signals without any valid spike are None
+    '''
+
+    sums, counts = spikeTriggeredSums(spikes, signals, Fs, staTime)
+
+    return {name: sums[name]/counts[name] if counts[name] > 0 else None for name in sums}
+
+
+def batchSTA(trials, Fs, staTime):
+    '''
+    function calculates the STAs for a list of trials, each given
+    as a tuple (spikes, dictionary of signals sampled at Fs)
+    returns per-trial STAs (name -> trials x samples, NaN if not available)
+    and the STAs pooled over all spikes of all trials (name -> STA)
+    '''
+
+    staRange = int(round(staTime*Fs))
+
+    perTrial = dict()
+    pooledSums = dict()
+    pooledCounts = dict()
+    for i, (spikes, signals) in enumerate(trials):
+        sums, counts = spikeTriggeredSums(spikes, signals, Fs, staTime)
+
+        for name in sums:
+            if name not in perTrial:
+                perTrial[name] = np.full((len(trials), staRange), np.nan)
+                pooledSums[name] = np.zeros(staRange)
+                pooledCounts[name] = 0
+
+            if counts[name] > 0:
+                perTrial[name][i] = sums[name]/counts[name]
+            pooledSums[name] += sums[name]
+            pooledCounts[name] += counts[name]
+
+    pooled = {
+        name: pooledSums[name]/pooledCounts[name] if pooledCounts[name] > 0 else None
+        for name in pooledSums
+    }
+
+    return perTrial, pooled
+
+
+################################################################
+# PHASE LOCKING
+
+def eodPeriods(eodTimes):
+    '''
+    function returns the EOD periods (2 x periods: start, end) for the EOD peak times
+    '''
+
+    eodTimes = np.asarray(eodTimes)
+    return np.array([eodTimes[:-1], eodTimes[1:]])
+
+
+def phaseLock(periods, spikes, bins=10):
+    '''
+    function calculates the phase of the first spike within each period
+    (2 x periods: start, end) by binary search of the (sorted) spike times
+    into the period starts
+
+    returns a dictionary with the phases [0, 1), the vector strength
+    and the phase histogram (counts and bin edges)
+    '''
+
+    periods = np.asarray(periods).reshape(2, -1)
+    spikes = np.asarray(spikes)
+    starts, ends = periods
+
+    phases = np.asarray([])
+    if spikes.shape[0] > 0 and starts.shape[0] > 0:
+        # first spike after the start of each period
+        firstIdcs = np.searchsorted(spikes, starts, side='right')
+        valid = firstIdcs < spikes.shape[0]
+        firstSpikes = spikes[np.minimum(firstIdcs, spikes.shape[0]-1)]
+        valid &= firstSpikes < ends
+
+        phases = (firstSpikes[valid] - starts[valid])/(ends[valid] - starts[valid])
+
+    counts, bins = np.histogram(phases, bins, range=(0, 1))
+
+    vectorStrength = np.nan
+    if phases.shape[0] > 0:
+        vectorStrength = np.abs(np.mean(np.exp(2j*np.pi*phases)))
+
+    return dict(
+        phases=phases,
+        vectorStrength=vectorStrength,
+        counts=counts,
+        bins=bins
+    )
+
+
+def reProPhaseLock(Df, bins=10):
+    '''
+    function calculates the phase locking of the spikes to the global EOD
+    for all processed trials of a RePro (DataFrame as provided by RePro.data());
+    for trials with a stimulus delay, baseline (pre) and stimulation (post)
+    periods are evaluated separately as well
+    '''
+
+    rows = dict()
+    for posIdx, trial in Df.iterrows():
+        spikes = trial.get('NeuronPeakTimes')
+        eodTimes = trial.get('GlobalEODPeakTimes')
+        if not isinstance(spikes, (list, np.ndarray)) or not isinstance(eodTimes, (list, np.ndarray)):
+            continue
+
+        periods = eodPeriods(eodTimes)
+        result = phaseLock(periods, spikes, bins=bins)
+        row = dict(phaseLockVS=result['vectorStrength'], phaseLockCounts=result['counts'])
+
+        delay = trial.get('delay')
+        if delay is not None and not pd.isna(delay):
+            for key, mask in [('Pre', periods[0] < delay), ('Post', periods[0] >= delay)]:
+                result = phaseLock(periods[:,mask], spikes, bins=bins)
+                row['phaseLockVS%s' % key] = result['vectorStrength']
+                row['phaseLockCounts%s' % key] = result['counts']
+
+        rows[posIdx] = row
+
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+################################################################
+# PEAK DETECTION
+
+def unmatchedPeaks(peakIdcs, refPeakIdcs, maxShift=1):
+    '''
+    function returns the fraction of peaks (of both detections) that
+    have no counterpart within maxShift samples in the other detection
+    '''
+
+    peakIdcs = np.sort(np.asarray(peakIdcs, dtype=int))
+    refPeakIdcs = np.sort(np.asarray(refPeakIdcs, dtype=int))
+    total = peakIdcs.shape[0] + refPeakIdcs.shape[0]
+    if total == 0:
+        return 0.
+
+    def unmatched(a, b):
+        if b.shape[0] == 0:
+            return a.shape[0]
+        pos = np.searchsorted(b, a)
+        dist = np.minimum(
+            np.abs(a - b[np.minimum(pos, b.shape[0] - 1)]),
+            np.abs(a - b[np.maximum(pos - 1, 0)])
+        )
+        return np.count_nonzero(dist > maxShift)
+
+    return (unmatched(peakIdcs, refPeakIdcs) + unmatched(refPeakIdcs, peakIdcs))/total
+
+
+################################################################
+# SPIKE TRAINS
+
+def concatenateTrains(spikeTrains):
+    '''
+    function returns the spike times of several trials in a single array
+    and the trial index of every spike; spikeTrains is a sequence of arrays
+    or a RaggedArray (nixlacs), whose buffer is used without copying
+    '''
+
+    if hasattr(spikeTrains, 'offsets'):
+        return spikeTrains.values.astype(float, copy=False), spikeTrains.rowIndices()
+
+    lengths = np.array([len(spikes) if spikes is not None else 0 for spikes in spikeTrains], dtype=int)
+    if lengths.sum() == 0:
+        return np.zeros(0), np.zeros(0, dtype=int)
+
+    times = np.concatenate([np.asarray(spikes, dtype=float) for spikes in spikeTrains if spikes is not None])
+    return times, np.repeat(np.arange(len(spikeTrains)), lengths)
+
+
+################################################################
+# BEAT PSTH
+
+def beatSpikeCounts(spikeTrains, beatLen, bins=10):
+    '''
+    function calculates the beat PSTHs of several spike trains at once
+    (spike times modulo beatLen, histogram with bins equal-sized bins
+    between first and last spike phase of each trial like np.histogram)
+    returns the spike counts (trials x bins)
+    '''
+
+    trialNum = len(spikeTrains)
+    times, trialIdcs = concatenateTrains(spikeTrains)
+    if times.shape[0] == 0:
+        return np.zeros((trialNum, bins), dtype=int)
+
+    times = times % beatLen
+    lengths = np.bincount(trialIdcs, minlength=trialNum)
+
+    # histogram range of each trial
+    nonEmpty = lengths > 0
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])[nonEmpty]
+    low = np.zeros(trialNum)
+    high = np.ones(trialNum)
+    low[nonEmpty] = np.minimum.reduceat(times, starts)
+    high[nonEmpty] = np.maximum.reduceat(times, starts)
+    constant = low == high
+    low[constant] -= 0.5
+    high[constant] += 0.5
+
+    # bin indices with the same rounding corrections as np.histogram
+    norm = bins / (high - low)
+    binIdcs = ((times - low[trialIdcs]) * norm[trialIdcs]).astype(int)
+    binIdcs[binIdcs == bins] -= 1
+    edges = np.linspace(low, high, bins+1, axis=1)
+    binIdcs[times < edges[trialIdcs, binIdcs]] -= 1
+    binIdcs[(times >= edges[trialIdcs, binIdcs+1]) & (binIdcs != bins-1)] += 1
+
+    return np.bincount(trialIdcs*bins + binIdcs, minlength=trialNum*bins).reshape(trialNum, bins)
+
+
+################################################################
+# SPATIAL MAPS
+
+class PositionIndex():
+    '''
+    nearest neighbor lookup of measurement positions
+    '''
+
+    def __init__(self, xPositions, yPositions):
+        self.points = np.column_stack([xPositions, yPositions]).astype(float)
+        self.tree = spatial.cKDTree(self.points)
+
+
+    def nearest(self, x, y):
+        '''
+        function returns the index of the position closest to (x, y)
+        '''
+
+        _, idx = self.tree.query([x, y])
+        return idx
+
+
+class HeatmapInterpolator():
+    '''
+    linear interpolation of values at scattered positions onto a regular grid
+    the Delaunay triangulation and the barycentric weights of all grid points
+    are calculated once, so that new values only cost a weighted sum
+    over the grid points that are affected by them.
+    Grid points outside of the convex hull are nan; if the positions
+    cannot be triangulated (e.g. all on a line) the value of the
+    nearest position is used instead
+    '''
+
+    def __init__(self, xPositions, yPositions, gridSize=100):
+        points = np.column_stack([xPositions, yPositions]).astype(float)
+
+        self.xGrid = np.linspace(points[:,0].min(), points[:,0].max(), gridSize)
+        self.yGrid = np.linspace(points[:,1].min(), points[:,1].max(), gridSize)
+        gridX, gridY = np.meshgrid(self.xGrid, self.yGrid)
+        gridPoints = np.column_stack([gridX.ravel(), gridY.ravel()])
+
+        try:
+            tri = spatial.Delaunay(points)
+            simplices = tri.find_simplex(gridPoints)
+            inside = simplices >= 0
+
+            transform = tri.transform[simplices[inside]]
+            bary = np.einsum('nij,nj->ni', transform[:,:2,:], gridPoints[inside] - transform[:,2,:])
+            self.weights = np.column_stack([bary, 1 - bary.sum(axis=1)])
+            self.vertices = tri.simplices[simplices[inside]]
+        except (spatial.QhullError, ValueError):
+            print('WARNING: Positions cannot be triangulated. Use nearest position for heatmap.')
+            _, nearest = spatial.cKDTree(points).query(gridPoints)
+            inside = np.ones(gridPoints.shape[0], dtype=bool)
+            self.weights = np.ones((gridPoints.shape[0], 1))
+            self.vertices = nearest[:,None]
+
+        self.gridIdcs = np.flatnonzero(inside)
+        self.values = np.full(points.shape[0], np.nan)
+        self.image = np.full(gridX.shape, np.nan)
+
+
+    def setValues(self, values, idcs=None):
+        '''
+        function sets the values at all positions (or at the positions idcs)
+        and updates the affected grid points; returns the image (y x x)
+        '''
+
+        if idcs is None:
+            self.values[:] = values
+            affected = np.ones(self.gridIdcs.shape[0], dtype=bool)
+        else:
+            self.values[idcs] = values
+            affected = np.isin(self.vertices, idcs).any(axis=1)
+
+        self.image.ravel()[self.gridIdcs[affected]] = np.sum(
+            self.weights[affected]*self.values[self.vertices[affected]], axis=1
+        )
+
+        return self.image
+
+
+################################################################
+# FI CURVES
+
+def windowRates(spikes, trialIdcs, trialNum, starts, ends):
+    '''
+    function returns the firing rates [Hz] within the windows [starts, ends)
+    (one per trial) of concatenated spike trains with trial indices trialIdcs
+    '''
+
+    inWindow = (spikes >= starts[trialIdcs]) & (spikes < ends[trialIdcs])
+    counts = np.bincount(trialIdcs[inWindow], minlength=trialNum)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates = counts / (ends - starts)
+    rates[ends <= starts] = np.nan
+
+    return rates
+
+
+def fiRates(spikeTrains, delays, durations, onsetWindow=0.05, steadyStateWindow=0.2):
+    '''
+    function calculates the firing rates of several FI curve trials at once
+    (spike times relative to trial start, stimulus onset at delay,
+    trial end at duration): baseline rate before stimulus onset (pre),
+    rate during the stimulus (post), onset response (first onsetWindow
+    after stimulus onset) and steady-state response (last steadyStateWindow
+    of the trial)
+    returns a dictionary of rate arrays (one value per trial)
+    '''
+
+    trialNum = len(spikeTrains)
+    delays = np.asarray(delays, dtype=float)
+    durations = np.asarray(durations, dtype=float)
+
+    spikes, trialIdcs = concatenateTrains(spikeTrains)
+
+    steadyStateStarts = np.maximum(durations - steadyStateWindow, delays)
+
+    return dict(
+        preRate=windowRates(spikes, trialIdcs, trialNum, np.zeros(trialNum), delays),
+        postRate=windowRates(spikes, trialIdcs, trialNum, delays, durations),
+        onsetRate=windowRates(spikes, trialIdcs, trialNum, delays, np.minimum(delays + onsetWindow, durations)),
+        steadyStateRate=windowRates(spikes, trialIdcs, trialNum, steadyStateStarts, durations)
+    )
+
+
+def reProFIRates(Df, onsetWindow=0.05, steadyStateWindow=0.2, spikeTrains=None):
+    '''
+    function calculates the FI rates (see fiRates) for all processed trials
+    of a FICurve RePro (DataFrame as provided by RePro.data());
+    the spike trains of all rows of Df may be given as RaggedArray
+    (RePro.ragged('NeuronPeakTimes')), so that its buffer is used directly;
+    the trial durations are taken from the column duration (see RePro.loadMtExtentData)
+    returns a DataFrame (one row per trial) with the rates and the stimulus columns
+    '''
+
+    if 'duration' not in Df.columns:
+        raise KeyError('FI rates require the trial durations (column duration)')
+
+    if spikeTrains is None:
+        mask = Df['NeuronPeakTimes'].apply(lambda spikes: isinstance(spikes, (list, np.ndarray))).values
+        mask = mask & Df['duration'].notna().values
+        spikeTrains = Df['NeuronPeakTimes'].values[mask]
+    else:
+        mask = spikeTrains.valid & Df['duration'].notna().values
+        spikeTrains = spikeTrains.take(np.flatnonzero(mask))
+    trials = Df.loc[mask]
+
+    durations = pd.to_numeric(trials['duration']).values
+
+    delays = np.zeros(trials.shape[0])
+    if 'delay' in trials.columns:
+        delays = pd.to_numeric(trials['delay'], errors='coerce').fillna(0.).values
+
+    rates = pd.DataFrame(
+        fiRates(spikeTrains, delays, durations, onsetWindow, steadyStateWindow),
+        index=trials.index
+    )
+
+    for key in ['Intensity', 'PreIntensity', 'Contrast', 'PreContrast', 'datasetId']:
+        if key in trials.columns:
+            rates[key] = trials[key].values
+
+    return rates
+
+
+def fiCurve(rates, groupBy=['Intensity']):
+    '''
+    function aggregates FI rates (as returned by reProFIRates) per group
+    returns a DataFrame with mean, std and number of trials of all rates
+    '''
+
+    rateKeys = ['preRate', 'postRate', 'onsetRate', 'steadyStateRate']
+    curve = rates.groupby(groupBy)[rateKeys].agg(['mean', 'std', 'count'])
+    curve.columns = ['%s_%s' % (key, stat) for key, stat in curve.columns]
+
+    return curve
+
+
+def datasetsFICurves(Df, onsetWindow=0.05, steadyStateWindow=0.2, rates=None):
+    '''
+    function calculates the FI curves of several datasets in a single batch
+    (Df contains the trials of FICurve RePros and their datasetId,
+    as in the RePro summary files; rates calculated before may be given)
+    returns the rates of all trials, the FI curves per dataset and intensity
+    and the population FI curve (mean over datasets) per intensity
+    '''
+
+    if rates is None:
+        rates = reProFIRates(Df, onsetWindow=onsetWindow, steadyStateWindow=steadyStateWindow)
+
+    datasetCurves = fiCurve(rates, groupBy=['datasetId', 'Intensity'])
+
+    meanKeys = [key for key in datasetCurves.columns if key.endswith('_mean')]
+    populationCurve = datasetCurves[meanKeys].groupby(level='Intensity').agg(['mean', 'std', 'count'])
+    populationCurve.columns = ['%s_%s' % (key[:-len('_mean')], stat) for key, stat in populationCurve.columns]
+
+    return rates, datasetCurves, populationCurve
+
+
+################################################################
+# ENVELOPES
+
+def envelopeTime(tEnd, envFs):
+    return np.arange(0, tEnd, 1/envFs)
+
+
+def peakEnvelope(peakTimes, peakAmps, envTime):
+    '''
+    function returns the envelope given by the linearly interpolated
+    (and at the borders extrapolated) peak amplitudes at times envTime
+    or None if there are not enough peaks
+    '''
+
+    if peakTimes is None or len(peakTimes) < 2:
+        return None
+
+    return interpolate.interp1d(peakTimes, peakAmps, fill_value='extrapolate')(envTime)
+
+
+def hilbertEnvelope(signal, Fs, envTime):
+    '''
+    function returns the amplitude of the analytic signal
+    resampled at times envTime
+    '''
+
+    if signal is None or len(signal) < 2:
+        return None
+
+    n = signal.shape[0]
+    env = np.abs(spSig.hilbert(signal, N=spFft.next_fast_len(n))[:n])
+
+    return np.interp(envTime, np.arange(0, n)/Fs, env)
+
+
+def extractEnvelope(envTime, peakTimes=None, peakAmps=None, signal=None, Fs=None, method='peaks'):
+    '''
+    function extracts an envelope either from the detected peaks (method 'peaks')
+    or from the signal trace by Hilbert transform (method 'hilbert')
+    '''
+
+    if method == 'hilbert':
+        return hilbertEnvelope(signal, Fs, envTime)
+
+    return peakEnvelope(peakTimes, peakAmps, envTime)
+
+
+################################################################
+# FIRING RATES
+
+def spikeCounts(spikes, Fs, n):
+    '''
+    function returns the number of spikes per sample (sampling rate Fs, n samples)
+    '''
+
+    idcs = (np.asarray(spikes)*Fs).astype(int)
+    idcs = idcs[(idcs >= 0) & (idcs < n)]
+
+    return np.bincount(idcs, minlength=n).astype(float)
+
+
+def batchFiringRates(spikeTrains, Fs, n, stdKernelWidths, chunkSize=256):
+    '''
+    function estimates the firing rates [Hz] of a list of spike trains
+    (sampled at Fs, n samples each) for several gaussian kernel widths in one pass:
+    the spike counts of all trials are transformed with a single FFT
+    and multiplied with the transfer functions of all kernels
+
+    returns an array (trials x kernel widths x n)
+    '''
+
+    stdKernelWidths = np.atleast_1d(stdKernelWidths)
+
+    # zero padding by the kernel half-width prevents circular wrap-around
+    padLen = int(np.ceil(5*np.max(stdKernelWidths)*Fs))
+    nfft = spFft.next_fast_len(n + padLen, real=True)
+    freq = np.fft.rfftfreq(nfft, 1./Fs)
+
+    # transfer functions of the gaussian kernels (kernel widths x freq)
+    transfer = np.exp(-2*np.square(np.pi*freq[None,:]*stdKernelWidths[:,None]))
+
+    rates = np.zeros((len(spikeTrains), stdKernelWidths.shape[0], n))
+    for chunkStart in range(0, len(spikeTrains), chunkSize):
+        chunk = spikeTrains[chunkStart:chunkStart+chunkSize]
+
+        counts = np.zeros((len(chunk), nfft))
+        for i, spikes in enumerate(chunk):
+            counts[i,:n] = spikeCounts(spikes, Fs, n)
+
+        countsFFT = spFft.rfft(counts, axis=-1)
+        conv = spFft.irfft(countsFFT[:,None,:]*transfer[None,:,:], nfft, axis=-1)
+        rates[chunkStart:chunkStart+len(chunk)] = conv[..., :n]*Fs
+
+    return rates
+
+
+def firingRates(spikes, Fs, n, stdKernelWidths):
+    '''
+    function estimates the firing rate [Hz] of a single spike train
+    for several gaussian kernel widths (returns kernel widths x n)
+    '''
+
+    return batchFiringRates([spikes], Fs, n, stdKernelWidths)[0]
+
+
+def reProFiringRates(Df, Fs=1000, stdKernelWidths=[0.002], tEnd=None):
+    '''
+    function estimates the firing rates of all processed trials of a RePro
+    (DataFrame as provided by RePro.data()) on a common time axis up to tEnd
+    (default: last spike of all trials)
+
+    returns the trial indices, time axis and rates (trials x kernel widths x samples)
+    '''
+
+    posIdcs = list()
+    spikeTrains = list()
+    for posIdx, spikes in Df['NeuronPeakTimes'].items():
+        if not isinstance(spikes, (list, np.ndarray)):
+            continue
+        posIdcs.append(posIdx)
+        spikeTrains.append(np.asarray(spikes))
+
+    if tEnd is None:
+        tEnd = max([spikes[-1] for spikes in spikeTrains if len(spikes) > 0] + [0])
+    time = envelopeTime(tEnd, Fs)
+
+    return posIdcs, time, batchFiringRates(spikeTrains, Fs, time.shape[0], stdKernelWidths)
+
+
+################################################################
+# FILE STIMULUS
+
+def fileStimulusEnvelopes(trial, tEnd, envFs=1000, method='peaks'):
+    '''
+    function extracts the noise AM and the envelopes of both local EODs
+    (sampled at envFs up to tEnd) from the processed data of a trial
+    (mapping with the keys 'stimTimes', 'stimAmps' and '<alias>PeakTimes',
+    '<alias>PeakAmps' or, for method 'hilbert', '<alias>' and '<alias>Dim'
+    for the aliases RefEOD and LocalEOD)
+    '''
+
+    envTime = envelopeTime(tEnd, envFs)
+
+    envelopes = dict(stimAm=peakEnvelope(trial['stimTimes'], trial['stimAmps'], envTime))
+    for name, alias in [('refEod', 'RefEOD'), ('localEod', 'LocalEOD')]:
+        envelopes[name] = extractEnvelope(
+            envTime,
+            peakTimes=trial.get('%sPeakTimes' % alias),
+            peakAmps=trial.get('%sPeakAmps' % alias),
+            signal=trial.get(alias),
+            Fs=trial.get('%sDim' % alias),
+            method=method
+        )
+
+    return envelopes
+
+
+def fileStimulusSignals(trial, envFs=1000, stdKernelWidth=0.002, envelopes=None, method='peaks'):
+    '''
+    function builds the signals that are compared in FileStimulus RePros
+    from the processed data of a trial (see fileStimulusEnvelopes):
+    the mean-free noise AM and envelopes of both local EODs (sampled at envFs)
+    and the spike train convolved with a gaussian kernel.
+    Envelopes that have been extracted before can be provided in envelopes
+
+    envelopes without sufficient peaks are None
+    '''
+
+    spikes = np.asarray(trial['NeuronPeakTimes'])
+    if spikes.shape[0] == 0:
+        return None
+
+    if envelopes is None:
+        envelopes = fileStimulusEnvelopes(trial, spikes[-1], envFs=envFs, method=method)
+
+    signals = meanFree(envelopes)
+    signals['spikes'] = spikeTrainSignal(spikes, envFs, stdKernelWidth)
+
+    return signals
+
+
+def meanFree(signals):
+    return {name: signal - np.mean(signal) if signal is not None else None for name, signal in signals.items()}
+
+
+def spikeTrainSignal(spikes, envFs=1000, stdKernelWidth=0.002):
+    '''
+    function returns the mean-free spike train convolved with a gaussian kernel
+    sampled at envFs up to the last spike (same length as the envelopes plus one)
+    '''
+
+    envNum = envelopeTime(spikes[-1], envFs).shape[0]
+    spikeConv = firingRates(spikes, envFs, envNum+1, stdKernelWidth)[0]
+
+    return spikeConv - np.mean(spikeConv)
+
+
+def reProFileStimulusSignals(Df, envFs=1000, stdKernelWidth=0.002, method='peaks'):
+    '''
+    function builds the signals of all processed trials of a FileStimulus RePro
+    (DataFrame as provided by RePro.data()) once, so that they can be shared
+    by all batch analyses; returns the trial indices, spike times and signals
+    '''
+
+    posIdcs = list()
+    spikes = list()
+    trialSignals = list()
+    for posIdx, trial in Df.iterrows():
+        if not isinstance(trial.get('NeuronPeakTimes'), (list, np.ndarray)):
+            continue
+
+        signals = fileStimulusSignals(trial, envFs=envFs, stdKernelWidth=stdKernelWidth, method=method)
+        if signals is None:
+            continue
+
+        posIdcs.append(posIdx)
+        spikes.append(np.asarray(trial['NeuronPeakTimes']))
+        trialSignals.append(signals)
+
+    return posIdcs, spikes, trialSignals
+
+
+def reProCoherence(Df, envFs=1000, stdKernelWidth=0.002, nperseg=2**10, noverlap=2**9, trialData=None):
+    '''
+    function calculates the stimulus/response coherences for all processed
+    trials of a FileStimulus RePro (DataFrame as provided by RePro.data()
+    or trialData as returned by reProFileStimulusSignals)
+    returns a DataFrame (one row per trial) and the frequencies
+    '''
+
+    if trialData is None:
+        trialData = reProFileStimulusSignals(Df, envFs=envFs, stdKernelWidth=stdKernelWidth)
+    posIdcs, spikes, trialSignals = trialData
+
+    pairs = [('stimAm', 'spikes'), ('refEod', 'spikes'), ('localEod', 'spikes')]
+
+    engine = SpectralEngine(envFs, nperseg=nperseg, noverlap=noverlap)
+    freq, coherence = engine.batchCoherence(trialSignals, pairs)
+
+    return pd.DataFrame(
+        {
+            'cohStimAm': list(coherence[pairs[0]]),
+            'cohRefEod': list(coherence[pairs[1]]),
+            'cohLocalEod': list(coherence[pairs[2]])
+        },
+        index=posIdcs
+    ), freq
+
+
+def reProSTA(Df, envFs=1000, staTime=0.03, stdKernelWidth=0.002, trialData=None):
+    '''
+    function calculates the STAs of noise AM and both EOD envelopes for
+    all processed trials of a FileStimulus RePro (DataFrame as provided by
+    RePro.data() or trialData as returned by reProFileStimulusSignals)
+    returns a DataFrame (one row per trial) and the pooled STAs
+    '''
+
+    if trialData is None:
+        trialData = reProFileStimulusSignals(Df, envFs=envFs, stdKernelWidth=stdKernelWidth)
+    posIdcs, spikes, trialSignals = trialData
+
+    names = ['stimAm', 'refEod', 'localEod']
+
+    trials = [
+        (trialSpikes, {name: signals[name] for name in names})
+        for trialSpikes, signals in zip(spikes, trialSignals)
+    ]
+    perTrial, pooled = batchSTA(trials, envFs, staTime)
+
+    staRange = int(round(staTime*envFs))
+    return pd.DataFrame(
+        {
+            'sta%s' % (name[0].upper() + name[1:]): list(perTrial.get(name, np.full((len(trials), staRange), np.nan)))
+            for name in names
+        },
+        index=posIdcs
+    ), pooled
+
+
+def fileStimulusSummary(Df, envFs=1000, staTime=0.03, stdKernelWidth=0.002, method='peaks'):
+    '''
+    function calculates STAs and coherences for all processed trials of a
+    FileStimulus RePro from envelopes that are extracted only once per trial
+    returns a DataFrame (one row per trial), the coherence frequencies and the pooled STAs
+    '''
+
+    trialData = reProFileStimulusSignals(Df, envFs=envFs, stdKernelWidth=stdKernelWidth, method=method)
+
+    staDf, pooledSTA = reProSTA(Df, envFs=envFs, staTime=staTime, trialData=trialData)
+    cohDf, freq = reProCoherence(Df, envFs=envFs, trialData=trialData)
+
+    return pd.concat([staDf, cohDf], axis=1), freq, pooledSTA
@@ -1,4 +1,7 @@
+import Analysis
+import collections
 import json
+import numpy as np
 import os
 import pandas as pd
 import pickle
@@ -30,6 +33,30 @@ class Config():
     cellTypes = ['SingleSpike',
                  'Burster',
                  'RythmicBurster']
+
+    # number of processed measurements kept in memory for fast browsing
+    signalCacheSize = 8
+
+    # process the signals of a measurement concurrently
+    parallelSignalProcessing = True
+    signalProcessingThreads = 5
+
+    # dtype of raw and filtered signal traces ('float32' halves their memory)
+    signalDtype = 'float64'
+
+    # compare the peak detection with the float64 path for every processed signal
+    # and warn if more than the given fraction of peaks is not matched within one sample
+    checkSignalDtype = False
+    signalDtypeTolerance = 0.01
+
+    # memory [bytes] for signal data of open content tabs before inactive tabs release theirs
+    memoryBudget = 4*2**30
+
+    # number of content tabs that load their RePro concurrently in the background
+    tabLoadingThreads = 2
+
+    # print every coalesced redraw of the analysis plots and the user action it belongs to
+    logRedraws = False
     
     @classmethod
     def setMainWindow(cls, MainWindow):
@@ -156,6 +183,88 @@ class Config():
         return path
 
 
+################################################################
+# MEMORY MANAGER
+
+class MemoryManager():
+    '''
+    keeps track of the memory held by the signal data of open content tabs
+    (clients implementing memoryBytes(), memoryKey(), releaseMemory() and restoreMemory())
+    and releases the data of the least recently active clients as long as
+    the total exceeds Config.memoryBudget; active clients and clients that share
+    their data (same memoryKey()) with an active client are never released,
+    released clients restore their data when they are activated again
+    '''
+
+    _clients = collections.OrderedDict()
+    _active = set()
+    _released = set()
+
+
+    @classmethod
+    def register(cls, client):
+        cls._clients[id(client)] = client
+
+
+    @classmethod
+    def unregister(cls, client):
+        cls._clients.pop(id(client), None)
+        cls._active.discard(id(client))
+        cls._released.discard(id(client))
+
+
+    @classmethod
+    def activate(cls, client):
+        key = id(client)
+        if key not in cls._clients:
+            cls.register(client)
+        cls._clients.move_to_end(key)
+        cls._active.add(key)
+
+        if key in cls._released:
+            cls._released.discard(key)
+            client.restoreMemory()
+
+        cls.enforceBudget()
+
+
+    @classmethod
+    def deactivate(cls, client):
+        cls._active.discard(id(client))
+        cls.enforceBudget()
+
+
+    @classmethod
+    def totalBytes(cls):
+        return sum(client.memoryBytes() for client in cls._clients.values())
+
+
+    @classmethod
+    def enforceBudget(cls):
+        total = cls.totalBytes()
+
+        # data displayed by active clients
+        activeData = [id(cls._clients[key].memoryKey()) for key in cls._active if key in cls._clients]
+
+        # least recently active clients first
+        for key, client in list(cls._clients.items()):
+            if total <= Config.memoryBudget:
+                break
+            if key in cls._active or key in cls._released or id(client.memoryKey()) in activeData:
+                continue
+
+            held = client.memoryBytes()
+            if held == 0:
+                continue
+
+            client.releaseMemory()
+            cls._released.add(key)
+
+            released = held - client.memoryBytes()
+            total -= released
+            print('Released %.1f MB of signal data (%s)' % (released/2**20, str(client)))
+
+
 ################################################################
 # FILE INTERACTIONS
 
@@ -242,8 +351,9 @@ class FileInteractions():
         if not os.path.exists(filepath):
             return pd.DataFrame()
 
+        # derived columns (peak times, PSD frequencies) are not stored
         if ftype == 'json':
-            return pd.read_json(filepath)
+            return Analysis.deriveResults(pd.read_json(filepath))
 
         return None
 
@@ -257,3 +367,133 @@ class FileInteractions():
 
         if ftype == 'json':
             Df.to_json(Config.getJsonPath(('%s.%s') % (filename, ftype)))
+
+
+################################################################
+# JSON COLUMN READER
+
+class JsonColumnReader():
+    '''
+    reads DataFrame JSON files (orient 'columns', as written by
+    FileInteractions.writeDfToFile) column by column.
+    Columns are located by a vectorized scan over the raw bytes in which
+    only quotes and brackets are inspected; each column can then be parsed
+    on its own, so that large array-valued columns are only parsed on request
+    '''
+
+    def __init__(self, filepath, chunkSize=2**24):
+        self.filepath = filepath
+        self.chunkSize = chunkSize
+
+        # column name -> (first byte, last byte, <bool> values are arrays/objects)
+        self.columns = dict()
+
+
+    def scanColumns(self):
+        '''
+        generator yields (column name, <bool> nested) for every column
+        as soon as its extent in the file is known
+        '''
+
+        data = np.memmap(self.filepath, dtype=np.uint8, mode='r')
+
+        # bracket depth changes
+        deltaTable = np.zeros(256, dtype=np.int8)
+        deltaTable[[ord('{'), ord('[')]] = 1
+        deltaTable[[ord('}'), ord(']')]] = -1
+
+        def isEscaped(pos):
+            bsStart = pos
+            while bsStart > 0 and data[bsStart-1] == ord('\\'):
+                bsStart -= 1
+            return (pos - bsStart) % 2 == 1
+
+        depth = 0
+        inString = False
+        name = None
+        nameStart = None
+        colStart = None
+        nested = False
+
+        for chunkStart in range(0, data.shape[0], self.chunkSize):
+            chunk = np.asarray(data[chunkStart:chunkStart+self.chunkSize])
+
+            # unescaped quotes
+            quotes = np.flatnonzero(chunk == ord('"'))
+            maybeEscaped = quotes[chunk[np.maximum(quotes-1, 0)] == ord('\\')]
+            if quotes.shape[0] > 0 and quotes[0] == 0 and chunkStart > 0 and data[chunkStart-1] == ord('\\'):
+                maybeEscaped = np.union1d(maybeEscaped, [0])
+            escaped = [q for q in maybeEscaped if q+chunkStart > 0 and isEscaped(q+chunkStart)]
+            if len(escaped) > 0:
+                quotes = np.setdiff1d(quotes, escaped)
+
+            # brackets outside of strings
+            deltas = deltaTable[chunk]
+            brackets = np.flatnonzero(deltas)
+            outside = (np.searchsorted(quotes, brackets) + inString) % 2 == 0
+            brackets = brackets[outside]
+            deltas = deltas[brackets]
+            depthAfter = depth + np.cumsum(deltas)
+
+            # column names are the only strings at depth 1
+            quoteDepth = depth + np.concatenate([[0], np.cumsum(deltas)])[np.searchsorted(brackets, quotes)]
+            opening = (np.arange(quotes.shape[0]) + inString) % 2 == 0
+            nameQuotes = np.flatnonzero(opening & (quoteDepth == 1))
+
+            events = sorted(
+                [(quotes[k], 'name', k) for k in nameQuotes]
+                + [(pos, 'start', None) for pos in brackets[(depthAfter == 2) & (deltas > 0)]]
+                + [(pos, 'end', None) for pos in brackets[(depthAfter == 1) & (deltas < 0)]]
+            )
+            nestedPos = brackets[(depthAfter == 3) & (deltas > 0)]
+
+            # name of the previous chunk ends at the first quote of this chunk
+            if nameStart is not None and quotes.shape[0] > 0:
+                name = json.loads(bytes(data[nameStart:chunkStart+quotes[0]+1]))
+                nameStart = None
+
+            # start of the current column relative to this chunk (negative if it started before)
+            localStart = -1 if colStart is None else colStart - chunkStart
+            for pos, kind, k in events:
+                if kind == 'name':
+                    if k+1 < quotes.shape[0]:
+                        name = json.loads(bytes(chunk[pos:quotes[k+1]+1]))
+                    else:
+                        nameStart = chunkStart + pos
+                elif kind == 'start':
+                    colStart = chunkStart + pos
+                    localStart = pos
+                    nested = False
+                else:
+                    nested |= np.any((nestedPos > localStart) & (nestedPos < pos))
+                    self.columns[name] = (colStart, chunkStart + pos, bool(nested))
+                    yield name, bool(nested)
+                    colStart = None
+
+            # column that continues in the next chunk
+            if colStart is not None:
+                nested |= np.any(nestedPos > localStart)
+
+            if deltas.shape[0] > 0:
+                depth = depthAfter[-1]
+            inString = (inString + quotes.shape[0]) % 2 == 1
+
+
+    def readColumn(self, name):
+        '''
+        function parses a single column (see scanColumns) and returns it as Series
+        '''
+
+        start, end, nested = self.columns[name]
+        with open(self.filepath, 'rb') as fObj:
+            fObj.seek(start)
+            values = json.loads(fObj.read(end - start + 1))
+
+        index = pd.Index(list(values.keys()))
+        numericIndex = pd.to_numeric(index, errors='coerce')
+        if not numericIndex.isna().any():
+            index = pd.Index(numericIndex)
+
+        if nested:
+            return pd.Series(list(values.values()), index=index, name=name, dtype=object)
+        return pd.Series(list(values.values()), index=index, name=name)
@@ -1,3 +1,4 @@
+import Analysis
 from Base import *
 from CustomWidgets import *
 import nixlacs
@@ -16,6 +17,65 @@ import utils
 
 from IPython import embed
 
+################################################################
+# ANALYSIS GRAPH
+
+class ComputeGraph():
+    '''
+    graph of the derived quantities of a content tab
+    each node declares the signal results (signal aliases) and other nodes
+    it depends on; only nodes with a changed dependency are recomputed,
+    and each of them only once per update
+    '''
+
+    def __init__(self):
+        self.nodes = dict()
+        self.values = dict()
+        self.dirty = set()
+
+
+    def addNode(self, name, fun, dependsOn=()):
+        '''
+        nodes have to be added after the nodes they depend on
+        fun is called without arguments and its return value is stored as value of the node
+        '''
+
+        self.nodes[name] = dict(fun=fun, dependsOn=set(dependsOn))
+        self.dirty.add(name)
+
+
+    def get(self, name):
+        return self.values.get(name)
+
+
+    def invalidate(self, sources):
+        '''
+        function marks all nodes as dirty that depend
+        (directly or indirectly) on one of the sources
+        '''
+
+        sources = set(sources)
+        for name, node in self.nodes.items():
+            if node['dependsOn'] & sources:
+                self.dirty.add(name)
+                sources.add(name)
+
+
+    def invalidateAll(self):
+        self.dirty = set(self.nodes.keys())
+
+
+    def update(self):
+        '''
+        function recomputes all dirty nodes in the order they have been added
+        '''
+
+        for name, node in self.nodes.items():
+            if name in self.dirty:
+                self.values[name] = node['fun']()
+        self.dirty = set()
+
+
 ################################################################
 # CONTENT WINDOW
 
@@ -29,11 +89,25 @@ class ContentTab(QtCore.QObject):
 
         self.curTime = None
         self.defaultSigProcSetting = None
+
+        # derived quantities of the analysis plots (nodes are added by subclasses)
+        self.analysisGraph = ComputeGraph()
+        # coalesces bursts of signal updates into a single redraw
+        self.updateScheduler = utils.UpdateScheduler(self.updateAnalysis, name=self.__class__.__name__)
         
         # set up content wrapper layout
-        self.contentWidget = QtWidgets.QWidget()
+        self.contentWidget = utils.ShowEventWidget()
         self.contentLayout = QtWidgets.QVBoxLayout()
         self.contentWidget.setLayout(self.contentLayout)
+
+        # signal data of inactive tabs may be released when memory is short
+        self.restoreWorker = None
+        if self.rePro is not None:
+            MemoryManager.register(self)
+            self.contentWidget.sigShown.connect(lambda: MemoryManager.activate(self))
+            self.contentWidget.sigHidden.connect(lambda: MemoryManager.deactivate(self))
+            # closed tabs no longer count against the memory budget
+            self.contentWidget.destroyed.connect(lambda *args: MemoryManager.unregister(self))
         
         self.setupNavBar()
 
@@ -53,6 +127,39 @@ class ContentTab(QtCore.QObject):
             self.tagMetadataTab = utils.metadataTreeWidget(self.rePro.getTagData().metadata)
             self.tabWidget.addTab(self.tagMetadataTab.widget, 'Tag metadata')
 
+            # the content (see setupContent of the subclasses) is only built when the tab
+            # is shown for the first time, after the RePro has been loaded in the background
+            self.loadingLabel = QtWidgets.QLabel('Tab is loaded when it is activated')
+            self.loadingLabel.setAlignment(QtCore.Qt.AlignCenter)
+            self.contentTabLayout.addWidget(self.loadingLabel)
+            self.naviBarWidget.setEnabled(False)
+            self.contentWidget.sigFirstShown.connect(self.startLoading)
+
+
+    def startLoading(self):
+        self.loadingLabel.setText('Loading %s...' % self.rePro.id())
+
+        self.loadingWorker = ReProLoadingWorker(self.rePro)
+        self.loadingWorker.signals.finished.connect(self.loadingFinished)
+        self.loadingWorker.signals.error.connect(
+            lambda msg: self.loadingLabel.setText('Loading %s failed (%s)' % (self.rePro.id(), msg))
+        )
+        ReProLoadingWorker.getPool().start(self.loadingWorker)
+
+
+    def loadingFinished(self, loader):
+        if loader is not None:
+            self.rePro.mergeCopy(loader)
+
+        print('Building tab for RePro %s' % self.rePro.id())
+
+        self.contentTabLayout.removeWidget(self.loadingLabel)
+        self.loadingLabel.deleteLater()
+
+        self.updateNavBar()
+        self.setupContent()
+        self.naviBarWidget.setEnabled(True)
+
 
     def setupNavBar(self):
 
@@ -75,11 +182,6 @@ class ContentTab(QtCore.QObject):
             self.comboRecCategories.addItem(category)
         self.naviBarLayout.addWidget(self.comboRecCategories)
 
-        if 'recordingCategory' in self.rePro.data().columns:
-            recCats = self.rePro.data().recordingCategory.unique()
-            if recCats.shape[0] > 0:
-                self.comboRecCategories.setCurrentText(recCats[0])
-                
         # add cell type combo box
         self.naviBarLayout.addWidget(QtWidgets.QLabel('Cell type: '))
         self.cellTypes = Config.cellTypes
@@ -89,19 +191,10 @@ class ContentTab(QtCore.QObject):
             self.comboCellTypes.addItem(cellType)
         self.naviBarLayout.addWidget(self.comboCellTypes)
 
-        if 'cellType' in self.rePro.data().columns:
-            cellTypes = self.rePro.data().cellType.unique()
-            if cellTypes.shape[0] > 0:
-                self.comboCellTypes.setCurrentText(cellTypes[0])
-
         # receptive field guess
         self.naviBarLayout.addWidget(QtWidgets.QLabel('RF position: '))
         self.inputRfPosition = QtWidgets.QLineEdit()
         self.naviBarLayout.addWidget(self.inputRfPosition)
-        if 'rfPosition' in self.rePro.data().columns:
-            rfPositions = self.rePro.data().rfPosition.unique()
-            if rfPositions.shape[0] > 0:
-                self.inputRfPosition.setText(str(rfPositions[0]))
         
         # spacer
         self.naviBarLayout.addStretch(stretch=1)
@@ -114,6 +207,24 @@ class ContentTab(QtCore.QObject):
         # connect standard signals
         self.naviBarSaveButton.clicked.connect(self.saveContentData)
 
+
+    def updateNavBar(self):
+        # set content info stored in the RePro data
+        if 'recordingCategory' in self.rePro.data().columns:
+            recCats = self.rePro.data().recordingCategory.unique()
+            if recCats.shape[0] > 0:
+                self.comboRecCategories.setCurrentText(recCats[0])
+
+        if 'cellType' in self.rePro.data().columns:
+            cellTypes = self.rePro.data().cellType.unique()
+            if cellTypes.shape[0] > 0:
+                self.comboCellTypes.setCurrentText(cellTypes[0])
+
+        if 'rfPosition' in self.rePro.data().columns:
+            rfPositions = self.rePro.data().rfPosition.unique()
+            if rfPositions.shape[0] > 0:
+                self.inputRfPosition.setText(str(rfPositions[0]))
+
         
     def addContentInfo(self, series):
         contentInfo = self.getContentInfo()
@@ -143,6 +254,132 @@ class ContentTab(QtCore.QObject):
             
     def useCurrentSettingsAsDefault(self):
         self.signalProcessor.useCurrentSettingsAsDefault()
+
+
+    def memoryBytes(self):
+        nbytes = self.rePro.signalBytes()
+        if hasattr(self, 'signalProcessor'):
+            nbytes += self.signalProcessor.cacheBytes()
+        return nbytes
+
+
+    def memoryKey(self):
+        # tabs of the same RePro share its signals
+        return self.rePro
+
+
+    def setContentEnabled(self, enabled):
+        # content and navigation bar (saving processes the raw signals) need the signals of the RePro
+        self.contentTab.setEnabled(enabled)
+        self.naviBarWidget.setEnabled(enabled)
+
+
+    def releaseMemory(self):
+        '''
+        function releases raw signals and the filtered signals of cached measurements;
+        processed results are kept (in the RePro data and in the signals on display),
+        raw signals are reloaded by restoreMemory; the content is disabled until then
+        '''
+
+        if self.restoreWorker is not None:
+            self.restoreWorker.cancel()
+            self.restoreWorker = None
+
+        self.setContentEnabled(False)
+        if hasattr(self, 'signalProcessor'):
+            self.signalProcessor.clearCache()
+        self.rePro.releaseSignals()
+
+
+    def restoreMemory(self):
+        '''
+        function reloads the raw signals in the background;
+        the content is disabled until they have been loaded
+        '''
+
+        if self.rePro.signalsLoaded() or self.restoreWorker is not None:
+            return
+
+        self.setContentEnabled(False)
+
+        self.restoreWorker = ReProLoadingWorker(self.rePro)
+        self.restoreWorker.signals.finished.connect(
+            lambda loader, worker=self.restoreWorker: self.memoryRestored(worker, loader)
+        )
+        self.restoreWorker.signals.error.connect(
+            lambda msg, worker=self.restoreWorker: self.memoryRestored(worker, None)
+        )
+        ReProLoadingWorker.getPool().start(self.restoreWorker)
+
+
+    def memoryRestored(self, worker, loader):
+        if worker is not self.restoreWorker:
+            return
+
+        self.restoreWorker = None
+        if loader is not None:
+            self.rePro.mergeCopy(loader)
+        self.setContentEnabled(True)
+
+
+    def __str__(self):
+        return '%s %s' % (self.datasetId, self.rePro.id() if self.rePro is not None else '')
+
+
+    def measurementProcessed(self):
+        '''
+        function is called when all signals of a measurement have been processed
+        '''
+
+        self.connectSignalTools()
+        self.plotAnalysisData()
+
+
+    def connectSignalTools(self):
+        # only the tools of the displayed measurement trigger updates
+        self.updateScheduler.unsubscribeAll()
+        for alias, signalData in self.signalProcessor.signals.items():
+            self.updateScheduler.subscribe(signalData.tool, signalData.tool.sigRunComplete, alias)
+
+
+    def plotAnalysisData(self):
+        self.updateScheduler.request(None)
+
+
+    def updateAnalysis(self, sources):
+        '''
+        function is called (once per event loop turn) by the update scheduler
+        and recomputes only the quantities that depend on the updated
+        signals (sources; None: all quantities)
+        '''
+
+        if None in sources:
+            self.analysisGraph.invalidateAll()
+        else:
+            self.analysisGraph.invalidate(sources)
+        self.analysisGraph.update()
+
+
+    def getPrefetchRows(self):
+        '''
+        function returns the rows of the measurement list that are likely
+        to be displayed next (by default the neighbors of the current row)
+        '''
+
+        row = self.measurementListWidget.currentRow()
+        return [r for r in [row+1, row-1] if 0 <= r < self.measurementListWidget.count()]
+
+
+    def prefetchMeasurements(self):
+        '''
+        function processes likely next measurements in the background
+        so that stepping through the measurement list is instant
+        '''
+
+        self.signalProcessor.prefetch([
+            self.rePro.data(int(self.measurementListWidget.item(row).text()))
+            for row in self.getPrefetchRows()
+        ])
         
         
     def startTimer(self):
@@ -157,18 +394,20 @@ class ContentTab(QtCore.QObject):
 
     def plotSTA(self, plotDataItem, spikes, signal, Fs, staTime, scalePlotTo=None):
 
-        staRange = int(round(staTime*Fs))
-        
-        staMat = np.zeros((staRange, spikes.shape[0]))
-        for i, s in enumerate(spikes):
-            tIdx = int(np.round(s*Fs))
-            if tIdx <= staRange or tIdx == signal.shape[0]:
-                continue
+        STA = Analysis.spikeTriggeredAverage(spikes, {'signal': signal}, Fs, staTime)['signal']
+        self.plotSTAData(plotDataItem, STA, Fs, staTime, scalePlotTo=scalePlotTo)
 
-            staMat[:,i] = signal[tIdx-staRange+1:tIdx+1]
+        return STA
+
+
+    def plotSTAData(self, plotDataItem, STA, Fs, staTime, scalePlotTo=None):
+
+        if STA is None:
+            plotDataItem.setData([], [])
+            return
+
+        staRange = int(round(staTime*Fs))
 
-        STA = np.mean(staMat, axis=1)
-        
         scale = 1
         if scalePlotTo is not None:
             scale = scalePlotTo/(np.max(STA) - np.min(STA))
@@ -178,13 +417,13 @@ class ContentTab(QtCore.QObject):
             (STA-np.mean(STA))*scale
         )
 
-        return STA
-
 
     def saveBatchData(self):
         '''
         function iterates over all rows in Df self.rePro.data()
-        and processes each row that has not previously been processed
+        and processes each row whose stored results are missing or outdated
+        (see SignalProcessor.processingKey); rows saved by hand and all other
+        rows keep their results
         '''
         
         self.startTimer()
@@ -194,20 +433,35 @@ class ContentTab(QtCore.QObject):
 
         print('Starting save to file for (%s // %s)' % (self.rePro.relacsFile.filepath, self.rePro.id()))
         
-        print('Processing all unmodified rows...')
         signalProcessorNoUi = SignalProcessor(
             self.rePro, 
             ui=False
         )
-        # update all rows that have been modified manually
-        for idx, series in self.rePro.data().iterrows():
-            
-            # do an automatic analysis for all rows that have not been manually modified
-            if series.additionalData != True:
-                signalProcessorNoUi.setSignals(series)
-                series = signalProcessorNoUi.getProcessedData()
-                
-            self.rePro.setData(self.addContentInfo(series.copy()))
+
+        Df = self.rePro.data()
+        storedKeys = Df['processingKey'] if 'processingKey' in Df.columns else pd.Series(None, index=Df.index)
+        keys = dict()
+        dirtyIdcs = list()
+        for idx, series in Df.iterrows():
+
+            # rows saved by hand (and rows saved before keys were stored) are never rerun
+            if series.additionalData == True and not isinstance(storedKeys[idx], str):
+                keys[idx] = None
+                continue
+
+            keys[idx] = signalProcessorNoUi.processingKey(series)
+            if storedKeys[idx] != keys[idx]:
+                dirtyIdcs.append(idx)
+
+        print('Processing %i of %i rows...' % (len(dirtyIdcs), Df.shape[0]))
+        for idx in dirtyIdcs:
+            signalProcessorNoUi.setSignals(self.rePro.data(idx))
+            self.rePro.setData(signalProcessorNoUi.getProcessedData())
+
+        # content info and keys are set for all rows at once
+        columns = self.getContentInfo()
+        columns['processingKey'] = [keys[idx] for idx in self.rePro.data().index]
+        self.rePro.setColumns(columns)
 
         # write to file
         self.rePro.writeToSaveFile()
@@ -223,23 +477,53 @@ class ContentTab(QtCore.QObject):
 
 
 
+################################################################
+# REPRO LOADING
+
+class ReProLoadingWorker(utils.Worker):
+    '''
+    opens the save file and loads the signals of a RePro into a copy of it
+    (see RePro.loadCopy); the copy has to be merged into the RePro
+    in the GUI thread (RePro.mergeCopy)
+    '''
+
+    _pool = None
+
+    def __init__(self, rePro):
+        super().__init__()
+        self.rePro = rePro
+
+
+    @classmethod
+    def getPool(cls):
+        '''
+        function returns the thread pool in which at most Config.tabLoadingThreads RePros are loaded at once
+        '''
+
+        if cls._pool is None:
+            cls._pool = QtCore.QThreadPool()
+            cls._pool.setMaxThreadCount(Config.tabLoadingThreads)
+        return cls._pool
+
+
+    def work(self):
+        if self.rePro.signalsLoaded():
+            return None
+        return self.rePro.loadCopy()
+
+
 ################################################################
 # BASELINE
 
 class BaselineActivity(ContentTab):
 
-    def __init__(self, *args):
-        super().__init__(*args)
-
+    def setupContent(self):
         # setup layout
         self.widget = QtWidgets.QWidget()
         self.layout = QtWidgets.QVBoxLayout()
         self.widget.setLayout(self.layout)
         self.contentTabLayout.addWidget(self.widget)
 
-        # load signals for this rePro
-        self.rePro.loadSignals()
-
         # add signal Processor (provide it with the pd.Series data for the current rePro)
         self.signalProcessor = SignalProcessor(
             self.rePro, 
@@ -263,25 +547,24 @@ class BaselineActivity(ContentTab):
         self.polarPlot = utils.PolarPlot()
         self.basicAnalysisLayout.addWidget(self.polarPlot, 0, 1)
         
-        self.signalProcessor.sigRunCompleteConnect(self.plotAnalysisData)
-        self.plotAnalysisData()
+        # derived quantities and the signal results they depend on
+        self.analysisGraph.addNode('isiHistogram', self.plotIsiHistogram, dependsOn=['Neuron'])
+        self.analysisGraph.addNode('phaseLock', self.plotPhaseLock, dependsOn=['Neuron', 'GlobalEOD'])
 
+        self.measurementProcessed()
 
-    def plotAnalysisData(self):
 
-        pDataEod = self.signalProcessor.signals['GlobalEOD'].tool.getProcessedData()
-        pDataNeuron = self.signalProcessor.signals['Neuron'].tool.getProcessedData()
+    def plotIsiHistogram(self):
+        spikeTimes = self.signalProcessor.signals['Neuron'].tool.peakTimes
 
-        spikeTimes = pDataNeuron['PeakTimes']
-        eodTimes = pDataEod['PeakTimes']
+        self.histogram.plotHistogram(data=np.diff(spikeTimes)*1000, bins=0.1)
 
-        eodPeriods = np.array([eodTimes[:-1], eodTimes[1:]])
-        mEodPeriod = np.mean(np.diff(eodPeriods, axis=0))
 
-        self.histogram.plotHistogram(data=np.diff(spikeTimes)*1000, bins=0.1)
-            
-        # plot phase lock
-        self.polarPlot.plotPhaseLock(eodPeriods, spikeTimes)
+    def plotPhaseLock(self):
+        spikeTimes = self.signalProcessor.signals['Neuron'].tool.peakTimes
+        eodTimes = self.signalProcessor.signals['GlobalEOD'].tool.peakTimes
+
+        return self.polarPlot.plotPhaseLock(Analysis.eodPeriods(eodTimes), spikeTimes)
 
 
 
@@ -304,18 +587,13 @@ class BaselineActivity(ContentTab):
 class ReceptiveField(ContentTab):
 
     
-    def __init__(self, *args):
-        super().__init__(*args)
-        
+    def setupContent(self):
         # setup layout
         self.widget = QtWidgets.QWidget()
         self.layout = QtWidgets.QGridLayout()
         self.widget.setLayout(self.layout)
         self.contentTabLayout.addWidget(self.widget)
 
-        # load signals for this rePro
-        self.rePro.loadSignals()
-
         # load important features
         self.rePro.loadMtFeatureData('x_pos')
         self.rePro.loadMtFeatureData('y_pos')
@@ -331,6 +609,11 @@ class ReceptiveField(ContentTab):
         positions = list(zip(*self.posGroups.groups.keys()))
         self.xPositions = np.asarray(list(positions[0]))
         self.yPositions = np.asarray(list(positions[1]))
+        self.positionIdcs = {pos: idx for idx, pos in enumerate(zip(self.xPositions, self.yPositions))}
+
+        # spatial index for mouse interaction and interpolation of the activity heatmap
+        self.positionIndex = Analysis.PositionIndex(self.xPositions, self.yPositions)
+        self.heatmapInterpolator = Analysis.HeatmapInterpolator(self.xPositions, self.yPositions)
 
         # set measurement list
         self.measurementListWidget = QtWidgets.QListWidget()
@@ -341,6 +624,7 @@ class ReceptiveField(ContentTab):
         # setup plot for measurement position overview and selection
         self.posOverview = utils.FigureWidget(labels={'left': 'DV-axis [mm]', 'bottom': 'RC-axis [mm]'})
         self.posOverview.plotMarkers(self.xPositions, self.yPositions)
+        self.posHeatmap = self.posOverview.plotHeatmap()
         self.posOverview.setFixedHeight(100)
         self.layout.addWidget(self.posOverview, 1, 0, 1, 2)
 
@@ -360,6 +644,11 @@ class ReceptiveField(ContentTab):
         self.posActivity.setFixedHeight(200)
         self.layout.addWidget(self.posActivity, 2, 0, 1, 2)
         self.posActivityPlotData = self.posActivity.plotMarkers([], [])
+
+        # beat PSTH map: beat length (from tag metadata) and the version
+        # of the spike times each trial's PSTH has been calculated from
+        self.beatLen = None
+        self.beatPsthVersions = dict()
         
         # setup signal processor
         self.signalProcessor = SignalProcessor(
@@ -399,8 +688,7 @@ class ReceptiveField(ContentTab):
         xPos = viewPositions.x()
         yPos = viewPositions.y()
 
-        distances = np.sqrt(np.square(self.xPositions-xPos)+np.square(self.yPositions-yPos))
-        minDistIdx = np.argmin(distances)
+        minDistIdx = self.positionIndex.nearest(xPos, yPos)
 
         self.xPos = self.xPositions[minDistIdx]
         self.yPos = self.yPositions[minDistIdx]
@@ -413,6 +701,21 @@ class ReceptiveField(ContentTab):
        return (self.xPos, self.yPos) 
 
 
+    def getPrefetchRows(self):
+        '''
+        re-implementation of parent method
+        adds all other measurements at the current position after the neighbors
+        '''
+
+        rows = super().getPrefetchRows()
+        row = self.measurementListWidget.currentRow()
+        for r in range(self.measurementListWidget.count()):
+            if r != row and r not in rows:
+                rows.append(r)
+
+        return rows
+
+
     def displayRfPosition(self):
         '''
         function handles the display of the signal processor widgets
@@ -435,14 +738,7 @@ class ReceptiveField(ContentTab):
         self.displayMeasurement(self.measurementListWidget.item(0))
 
 
-    def plotActivity(self):
-
-        Df = self.rePro.data()
-
-        if 'NeuronPeakTimes' not in Df.columns:
-            return
-        
-        mask = Df['NeuronPeakTimes'].notna()
+    def getBeatLength(self):
         tagMetadata = nixlacs.getMetadataDict(self.rePro.getTagData().metadata)
         for key in tagMetadata.keys():
             if key.startswith('dataset'):
@@ -451,30 +747,91 @@ class ReceptiveField(ContentTab):
         keyParts = keyDataset.split('-')
         keySettings = '-'.join([keyParts[0], 'settings', *keyParts[1:]])
         deltaF = tagMetadata[keyDataset][keySettings]['deltaf']
-        stimDur = tagMetadata[keyDataset][keySettings]['duration']
-        beatLen = 1/deltaF
-        beatNum = stimDur/beatLen
 
-        # calculate beat PSTH
-        for posIdx, series in Df.loc[mask, ['x_pos', 'NeuronPeakTimes']].iterrows():
-            x = series['x_pos']
-            times = 1*series['NeuronPeakTimes'] # COPY ARRAY OR GET PWNED BY PASS-BY-REFERENCE!!!
-            times %= beatLen
-            
-            counts, _ = np.histogram(times, 10)
+        return 1/deltaF
 
-            series['beatSpikeCounts'] = counts
-            series['beatPsthSd'] = np.std(counts)
-            self.rePro.setData(series)
+
+    def plotActivity(self):
+        '''
+        function updates the beat PSTH modulation map
+        PSTHs are only recalculated for trials whose spike times have changed
+        '''
+
+        Df = self.rePro.data()
+
+        if 'NeuronPeakTimes' not in Df.columns:
+            return
+
+        if self.beatLen is None:
+            self.beatLen = self.getBeatLength()
+
+        # first pass: spike trains of all trials from the packed buffer of the RePro
+        packed = None
+        if len(self.beatPsthVersions) == 0:
+            packed = self.rePro.ragged('NeuronPeakTimes')
+            Df = self.rePro.data()
+
+        mask = Df['NeuronPeakTimes'].notna()
+        spikeTrains = Df.loc[mask, 'NeuronPeakTimes']
+
+        # trials with new or modified spike times
+        changed = [
+            posIdx for posIdx in spikeTrains.index
+            if self.beatPsthVersions.get(posIdx) != self.rePro.dataVersion(posIdx, 'NeuronPeakTimes')
+        ]
+
+        # calculate beat PSTH
+        if len(changed) > 0:
+            if packed is not None:
+                counts = Analysis.beatSpikeCounts(packed.take(np.flatnonzero(mask.values)), self.beatLen)
+            else:
+                counts = Analysis.beatSpikeCounts(spikeTrains.loc[changed].values, self.beatLen)
+            for posIdx, trialCounts in zip(changed, counts):
+                series = pd.Series(
+                    [trialCounts, np.std(trialCounts)],
+                    index=['beatSpikeCounts', 'beatPsthSd'],
+                    name=posIdx,
+                    dtype=object
+                )
+                self.rePro.setData(series)
+                self.beatPsthVersions[posIdx] = self.rePro.dataVersion(posIdx, 'NeuronPeakTimes')
+
+            self.plotHeatmap(changed)
 
         # plot data
         Df = self.rePro.data()
-        self.posActivityPlotData.setData(Df.loc[mask,'x_pos'].values, Df.loc[mask,'beatPsthSd'].values)
+        self.posActivityPlotData.setData(Df.loc[mask,'x_pos'].values, Df.loc[mask,'beatPsthSd'].values.astype(float))
+
+
+    def plotHeatmap(self, posIdcs):
+        '''
+        function updates the heatmap of the mean beat PSTH modulation
+        at the positions of the trials posIdcs
+        '''
+
+        Df = self.rePro.data()
+
+        positions = sorted(set(zip(Df.loc[posIdcs, 'x_pos'], Df.loc[posIdcs, 'y_pos'])))
+        values = [
+            np.nanmean(pd.to_numeric(Df.loc[self.posGroups.groups[pos], 'beatPsthSd'], errors='coerce'))
+            for pos in positions
+        ]
+
+        image = self.heatmapInterpolator.setValues(values, [self.positionIdcs[pos] for pos in positions])
+        if np.all(np.isnan(image)):
+            return
+
+        self.posHeatmap.setImage(image.T, levels=(np.nanmin(image), np.nanmax(image)))
+        xGrid = self.heatmapInterpolator.xGrid
+        yGrid = self.heatmapInterpolator.yGrid
+        self.posHeatmap.setRect(QtCore.QRectF(xGrid[0], yGrid[0], xGrid[-1]-xGrid[0], yGrid[-1]-yGrid[0]))
         
     def displayMeasurement(self, item):
+        self.updateScheduler.beginAction('display %s' % item.text())
         self.saveMeasurementData()
         self.plotActivity()
-        self.signalProcessor.setSignals(self.rePro.data(int(item.text())))
+        self.signalProcessor.setSignalsAsync(self.rePro.data(int(item.text())))
+        self.prefetchMeasurements()
 
         
     def saveContentData(self):
@@ -490,18 +847,13 @@ class ReceptiveField(ContentTab):
 
 class FICurve(ContentTab):
         
-    def __init__(self, *args):
-        super().__init__(*args)
-
+    def setupContent(self):
         # setup layout
         self.widget = QtWidgets.QWidget()
         self.layout = QtWidgets.QGridLayout()
         self.widget.setLayout(self.layout)
         self.contentTabLayout.addWidget(self.widget)
 
-        # load signals for this rePro
-        self.rePro.loadSignals()
-
         # load important features
         self.rePro.loadMtFeatureData('Contrast')
         self.rePro.loadMtFeatureData('PreContrast')
@@ -538,6 +890,7 @@ class FICurve(ContentTab):
         )
         self.layout.addWidget(self.signalProcessor.widget, 1, 2, 1, 3)
         self.layout.setColumnStretch(2, 99)
+        self.signalProcessor.sigSignalsSet.connect(self.measurementProcessed)
         
         # plot phase lock during baseline activity
         self.phaseLockPlotPre = utils.PolarPlot()
@@ -547,6 +900,9 @@ class FICurve(ContentTab):
         self.phaseLockPlotPost = utils.PolarPlot()
         self.layout.addWidget(self.phaseLockPlotPost, 2, 4)
 
+        # derived quantities and the signal results they depend on
+        self.analysisGraph.addNode('phaseLock', self.plotPhaseLock, dependsOn=['Neuron', 'GlobalEOD'])
+
         # select first intensity
         self.listIntensities.setCurrentRow(0)
         self.displayIntensity(self.listIntensities.currentItem())
@@ -571,25 +927,20 @@ class FICurve(ContentTab):
 
         
     def displayMeasurement(self, item):
+        self.updateScheduler.beginAction('display %s' % item.text())
         self.saveMeasurementData()
-        self.signalProcessor.setSignals(self.rePro.data(int(item.text())))
-        self.signalProcessor.sigRunCompleteConnect(self.plotAnalysisData)
+        self.signalProcessor.setSignalsAsync(self.rePro.data(int(item.text())))
+        self.prefetchMeasurements()
 
-        self.plotAnalysisData()
-        
 
-    def plotAnalysisData(self):
+    def plotPhaseLock(self):
         
-        pDataEod = self.signalProcessor.signals['GlobalEOD'].tool.getProcessedData()
-        pDataNeuron = self.signalProcessor.signals['Neuron'].tool.getProcessedData()
+        spikeTimes = self.signalProcessor.signals['Neuron'].tool.peakTimes
+        eodTimes = self.signalProcessor.signals['GlobalEOD'].tool.peakTimes
 
-        spikeTimes = pDataNeuron['PeakTimes']
-        eodTimes = pDataEod['PeakTimes']
+        eodPeriods = Analysis.eodPeriods(eodTimes)
 
-        eodPeriods = np.array([eodTimes[:-1], eodTimes[1:]])
-        mEodPeriod = np.mean(np.diff(eodPeriods, axis=0))
-
-        delay = self.rePro.data(int(self.measurementListWidget.currentItem().text()))['delay']
+        delay = self.signalProcessor.series['delay']
 
         self.phaseLockPlotPre.plotPhaseLock(eodPeriods[:,eodTimes[:-1] < delay], spikeTimes)
 
@@ -610,17 +961,13 @@ class FICurve(ContentTab):
 
 class FileStimulus(ContentTab):
         
-    def __init__(self, *args):
-        super().__init__(*args)
-
+    def setupContent(self):
         # setup layout
         self.widget = QtWidgets.QWidget()
         self.layout = QtWidgets.QGridLayout()
         self.widget.setLayout(self.layout)
         self.contentTabLayout.addWidget(self.widget)
 
-        # load signals for this rePro
-        self.rePro.loadSignals()
         self.rePro.loadStimulusData(baseDir=['..'])
 
         # set measurement list
@@ -639,6 +986,7 @@ class FileStimulus(ContentTab):
             ui=True
         )
         self.layout.addWidget(self.signalProcessor.widget, 1, 1)
+        self.signalProcessor.sigSignalsSet.connect(self.measurementProcessed)
 
         ## analysis plots
         # add STA figure
@@ -652,6 +1000,10 @@ class FileStimulus(ContentTab):
         self.figWidget.layout().addWidget(self.staFigure)
         # STA settings
         self.staTime = 0.03 # s
+        # envelope and spike train sampling rate / convolution kernel width
+        self.envFs = 1000 # Hz
+        self.stdKernelWidth = 0.002 # s
+        self.stimEnvelopes = utils.LRUCache(Config.signalCacheSize)
 
         # add coherence figure
         self.cohFigure = utils.FigureWidget(labels={'bottom': 'Freq [Hz]', 'left': 'AM/Response Coherence'})
@@ -663,6 +1015,12 @@ class FileStimulus(ContentTab):
         self.figWidget.layout().addWidget(self.cohFigure)
         
         self.layout.addWidget(self.figWidget, 2, 1)
+
+        # derived quantities and the signal results they depend on
+        self.analysisGraph.addNode('spikeTrain', self.calcSpikeTrain, dependsOn=['Neuron'])
+        self.analysisGraph.addNode('envelopes', self.calcEnvelopes, dependsOn=['Neuron', 'RefEOD', 'LocalEOD'])
+        self.analysisGraph.addNode('sta', self.plotSTAs, dependsOn=['Neuron', 'envelopes'])
+        self.analysisGraph.addNode('coherence', self.plotCoherence, dependsOn=['envelopes', 'spikeTrain'])
         
         # select first measurement
         self.measurementListWidget.setCurrentRow(0)
@@ -670,114 +1028,97 @@ class FileStimulus(ContentTab):
         
 
     def displayMeasurement(self, item):
+        self.updateScheduler.beginAction('display %s' % item.text())
         self.saveMeasurementData()
-        self.signalProcessor.setSignals(self.rePro.data(int(item.text())))
-        self.signalProcessor.sigRunCompleteConnect(self.plotAnalysisData)
+        self.signalProcessor.setSignalsAsync(self.rePro.data(int(item.text())))
+        self.prefetchMeasurements()
 
-        self.plotAnalysisData()
 
+    def calcSpikeTrain(self):
+        spikes = self.signalProcessor.signals['Neuron'].tool.peakTimes
+        if len(spikes) == 0:
+            return None
 
-    def plotAnalysisData(self):
-        
-        pDataNeuron = self.signalProcessor.signals['Neuron'].tool.getProcessedData()
-        series = self.signalProcessor.series
-        spikes = pDataNeuron['PeakTimes']
-        envFs = 1000
-        
-        # plot STA of noise stimulus
-        stimAmInterFun = interpolate.interp1d(series['stimTimes'], series['stimAmps'], fill_value='extrapolate')
-        stimAmEnv = stimAmInterFun(np.arange(0, spikes[-1], 1/envFs))
-        stimAmEnv -= np.mean(stimAmEnv)
-
-        stimSTA = self.plotSTA(
-            plotDataItem=self.staNoiseDataItem,
-            spikes=spikes,
-            signal=stimAmEnv,
-            Fs=envFs,
-            staTime=self.staTime,
-            scalePlotTo=1
-        )
+        return Analysis.spikeTrainSignal(spikes, envFs=self.envFs, stdKernelWidth=self.stdKernelWidth)
 
-        # plot STA of reference EOD
-        pDataRefEod = self.signalProcessor.signals['RefEOD'].tool.getProcessedData()
-        rEodPeakTimes = pDataRefEod['PeakTimes']
-        rEodPeaks = pDataRefEod['PeakAmps']
-        rEodInterFun = interpolate.interp1d(rEodPeakTimes, rEodPeaks, fill_value='extrapolate')
-        rEodEnv = rEodInterFun(np.arange(0, spikes[-1], 1/envFs))
-        rEodEnv -= np.mean(rEodEnv)
-        
-        rEodSTA = self.plotSTA(
-            plotDataItem=self.staREodDataItem,
-            spikes=spikes,
-            signal=rEodEnv,
-            Fs=envFs,
-            staTime=self.staTime,
-            scalePlotTo=1
-        )
 
-        # plot STA of local EOD
-        pDataLocalEod = self.signalProcessor.signals['LocalEOD'].tool.getProcessedData()
-        lEodPeakTimes = pDataLocalEod['PeakTimes']
-        if len(lEodPeakTimes) == 0:
-            self.staLEodDataItem.setData([], [])
-            return
-        
-        lEodPeaks = pDataLocalEod['PeakAmps']
-        lEodInterFun = interpolate.interp1d(lEodPeakTimes, lEodPeaks, fill_value='extrapolate')
-        lEodEnv = lEodInterFun(np.arange(0, spikes[-1], 1/envFs))
-        lEodEnv -= np.mean(lEodEnv)
-        
-        lEodSTA = self.plotSTA(
-            plotDataItem=self.staLEodDataItem,
-            spikes=spikes,
-            signal=lEodEnv,
-            Fs=envFs,
-            staTime=self.staTime,
-            scalePlotTo=1
-        )
+    def calcEnvelopes(self):
+        spikes = self.signalProcessor.signals['Neuron'].tool.peakTimes
+        if len(spikes) == 0:
+            return None
+
+        # envelopes are extracted once per trial and signal
+        tEnd = spikes[-1]
+        return Analysis.meanFree(dict(
+            stimAm=self.getStimulusEnvelope(tEnd),
+            refEod=self.signalProcessor.signals['RefEOD'].tool.getEnvelope(self.envFs, tEnd),
+            localEod=self.signalProcessor.signals['LocalEOD'].tool.getEnvelope(self.envFs, tEnd)
+        ))
+
+
+    def plotSTAs(self):
         
-        ## plot coherence
-        params = dict(fs=envFs, nperseg=2**10, noverlap=2**9)
-        stdKernelWidth = 0.002
+        spikes = self.signalProcessor.signals['Neuron'].tool.peakTimes
+        envelopes = self.analysisGraph.get('envelopes')
+        if envelopes is None:
+            envelopes = dict()
 
-        # reference
-        t = np.arange(-5*stdKernelWidth, 5*stdKernelWidth, 1/envFs)
-        kernel = normDistr.pdf(t, loc=0, scale=stdKernelWidth)
-        spikeConv = np.zeros(rEodEnv.shape[0]+1)
-        spikeConv[(spikes*envFs).astype(int)] = 1
-        spikeConv = np.convolve(spikeConv, kernel, mode='same')
-        spikeConv -= np.mean(spikeConv)
+        # plot STAs of noise stimulus, reference EOD and local EOD
+        STAs = Analysis.spikeTriggeredAverage(spikes, envelopes, self.envFs, self.staTime)
+        for name, dataItem in [('stimAm', self.staNoiseDataItem),
+                               ('refEod', self.staREodDataItem),
+                               ('localEod', self.staLEodDataItem)]:
+            self.plotSTAData(dataItem, STAs.get(name), self.envFs, self.staTime, scalePlotTo=1)
 
-        # stimulus AM
-        Pxx = spSig.csd(stimAmEnv, stimAmEnv, **params)[1]
-        Pyy = spSig.csd(spikeConv, spikeConv, **params)[1]
-        Pxy = spSig.csd(stimAmEnv, spikeConv, **params)
-        freq = Pxy[0]
-        coh = np.abs(Pxy[1])**2/(np.abs(Pxx)*np.abs(Pyy))
+        return STAs
 
-        self.cohDataItemStimAm.setData(freq[freq <= 500], coh[freq <= 500])
 
+    def plotCoherence(self):
 
-        # reference Eod
-        Pxx = spSig.csd(rEodEnv, rEodEnv, **params)[1]
-        Pyy = spSig.csd(spikeConv, spikeConv, **params)[1]
-        Pxy = spSig.csd(rEodEnv, spikeConv, **params)
-        freq = Pxy[0]
-        coh = np.abs(Pxy[1])**2/(np.abs(Pxx)*np.abs(Pyy))
+        envelopes = self.analysisGraph.get('envelopes')
+        spikeTrain = self.analysisGraph.get('spikeTrain')
+        if envelopes is None or spikeTrain is None:
+            envelopes = dict()
 
-        self.cohDataItemRef.setData(freq[freq <= 500], coh[freq <= 500])
+        # all spectra are calculated from a single FFT per signal
+        signals = {name: signal for name, signal in envelopes.items() if signal is not None}
+        spectra = None
+        if len(signals) > 0:
+            signals['spikes'] = spikeTrain
+            spectra = Analysis.SpectralEngine(self.envFs, nperseg=2**10, noverlap=2**9).crossSpectra(signals)
 
-        
-        # local Eod
-        Pxx = spSig.csd(lEodEnv, lEodEnv, **params)[1]
-        Pyy = spSig.csd(spikeConv, spikeConv, **params)[1]
-        Pxy = spSig.csd(lEodEnv, spikeConv, **params)
-        freq = Pxy[0]
-        coh = np.abs(Pxy[1])**2/(np.abs(Pxx)*np.abs(Pyy))
+        for name, dataItem in [('stimAm', self.cohDataItemStimAm),
+                               ('refEod', self.cohDataItemRef),
+                               ('localEod', self.cohDataItemLocal)]:
+            if name not in signals:
+                dataItem.setData([], [])
+                continue
 
-        self.cohDataItemLocal.setData(freq[freq <= 500], coh[freq <= 500])
+            freq = spectra.freq
+            coh = spectra.coherence(name, 'spikes')
+            dataItem.setData(freq[freq <= 500], coh[freq <= 500])
+
+        return spectra
+
+
+    def getStimulusEnvelope(self, tEnd):
+        '''
+        the noise stimulus is the same for all trials:
+        its envelope only depends on the trial length
+        '''
+
+        envelope = self.stimEnvelopes.get(tEnd)
+        if envelope is None:
+            series = self.signalProcessor.series
+            envelope = Analysis.peakEnvelope(
+                series['stimTimes'],
+                series['stimAmps'],
+                Analysis.envelopeTime(tEnd, self.envFs)
+            )
+            self.stimEnvelopes.set(tEnd, envelope)
+
+        return envelope
 
-        
 
     def saveContentData(self):
         '''
@@ -871,7 +1212,8 @@ class DatasetCombination(ContentTab):
             
             self.nixFiles[datasetId] = nixlacs.RelacsFile(
                 filepath=Config.getDataPath(datasetId), 
-                savepath=Config.getJsonPath()
+                savepath=Config.getJsonPath(),
+                signalDtype=Config.signalDtype
             )
 
 
@@ -1020,6 +1362,7 @@ class DatasetCombination(ContentTab):
     def processAll(self):
 
         self.dataLists = dict()
+        self.fiRateLists = dict()
         for datasetId in self.nixFiles:
             for rePro in self.nixFiles[datasetId].rePros():
                 reProName = rePro.__class__.__name__
@@ -1039,6 +1382,11 @@ class DatasetCombination(ContentTab):
                     if self.references[reProName][refName].checkState() == QtCore.Qt.CheckState(2):
                         rePro.loadReferenceData(refName)
 
+                # trial durations of the FI rates
+                if reProName == 'FICurveRePro' and ('duration' not in rePro.data().columns
+                                                    or rePro.data()['duration'].isna().any()):
+                    rePro.loadMtExtentData()
+
                 Df = rePro.data()
                 Df['datasetId'] = datasetId
 
@@ -1094,6 +1442,14 @@ class DatasetCombination(ContentTab):
                     Df[propName] = propVal
                     print('%s > %s' % (propName, str(propVal)))
 
+                # FI rates are calculated from the packed spike times of the RePro
+                if reProName == 'FICurveRePro' and 'NeuronPeakTimes' in Df.columns:
+                    spikeTrains = rePro.ragged('NeuronPeakTimes')
+                    included = (Df.excludeTrial == 0).values
+                    rates = Analysis.reProFIRates(Df[included], spikeTrains=spikeTrains.take(np.flatnonzero(included)))
+                    rates.index = ['%s_%i' % (datasetId, posIdx) for posIdx in rates.index]
+                    self.fiRateLists.setdefault(reProName, list()).append(rates)
+
                 Df = Df[Df.excludeTrial == 0]
                     
                 # create new Df with appropriate indices
@@ -1110,20 +1466,87 @@ class DatasetCombination(ContentTab):
         # save to file
         print('Saving to RePro summary files...')
         for reProName in self.dataLists.keys():
-            FileInteractions.writeDfToFile(
-                pd.concat(self.dataLists[reProName], sort=False),
-                'Summary_%s' % (reProName)
-            )
+            Df = pd.concat(self.dataLists[reProName], sort=False)
+            FileInteractions.writeDfToFile(Analysis.compactResults(Df), 'Summary_%s' % (reProName))
+
+            # FI curves of all datasets are calculated in a single batch
+            if reProName == 'FICurveRePro' and 'NeuronPeakTimes' in Df.columns:
+                print('Calculating FI curves...')
+                rates = None
+                if reProName in self.fiRateLists:
+                    rates = pd.concat(self.fiRateLists[reProName], sort=False)
+                rates, datasetCurves, populationCurve = Analysis.datasetsFICurves(Df, rates=rates)
+                FileInteractions.writeDfToFile(rates, 'Summary_%s_FIRates' % (reProName))
+                FileInteractions.writeDfToFile(datasetCurves.reset_index(), 'Summary_%s_FICurves' % (reProName))
+                FileInteractions.writeDfToFile(populationCurve.reset_index(), 'Summary_%s_PopulationFICurve' % (reProName))
 
 
 ################################################################
 # EXPLORE JSON FILE
 
+class JsonScanWorker(utils.Worker):
+    '''
+    locates all columns of a JSON file and loads the scalar columns;
+    loaded columns are delivered in batches via signals.progress,
+    array-valued columns are delivered as None (not loaded)
+    '''
+
+    def __init__(self, reader, batchInterval=0.2):
+        super().__init__()
+        self.reader = reader
+        self.batchInterval = batchInterval
+
+
+    def work(self):
+        batch = dict()
+        indexKnown = False
+        lastEmit = time.time()
+
+        for name, nested in self.reader.scanColumns():
+            if self.isCancelled():
+                return None
+
+            if nested:
+                batch[name] = None
+            else:
+                batch[name] = self.reader.readColumn(name)
+                indexKnown = True
+
+            # placeholders can only be displayed once the rows are known
+            if indexKnown and time.time() - lastEmit > self.batchInterval:
+                self.signals.progress.emit(batch)
+                batch = dict()
+                lastEmit = time.time()
+
+        # file without scalar columns: rows are given by the first column
+        if not indexKnown and len(batch) > 0:
+            name = list(batch.keys())[0]
+            batch[name] = self.reader.readColumn(name)
+
+        return batch
+
+
+class JsonColumnWorker(utils.Worker):
+
+    def __init__(self, reader, name):
+        super().__init__()
+        self.reader = reader
+        self.name = name
+
+
+    def work(self):
+        return self.reader.readColumn(self.name)
+
+
 class ExploreJsonFile(ContentTab):
 
     def __init__(self):
         super().__init__()
 
+        self.jsonReader = None
+        self.scanWorker = None
+        self.columnWorkers = dict()
+
         self.setupUi()
 
         
@@ -1144,9 +1567,20 @@ class ExploreJsonFile(ContentTab):
         self.filenameLbl = QtWidgets.QLabel('Filename')
         self.layout.addWidget(self.filenameLbl, 1, 0)
         
+        # row filter (DataFrame.query expression)
+        self.filterInput = QtWidgets.QLineEdit()
+        self.filterInput.setPlaceholderText('Filter rows, e.g. excludeTrial == 0 and Intensity > 0.5')
+        self.filterInput.returnPressed.connect(self.filterRows)
+        self.layout.addWidget(self.filterInput, 2, 0)
+
         # table widget
         self.tableWidget = utils.CustomTableWidget()
-        self.layout.addWidget(self.tableWidget, 2, 0)
+        self.tableWidget.horizontalHeader().sectionDoubleClicked.connect(self.loadColumn)
+        self.layout.addWidget(self.tableWidget, 3, 0)
+
+
+    def filterRows(self):
+        self.tableWidget.setFilter(self.filterInput.text())
 
         
     def openJsonFile(self):
@@ -1157,12 +1591,102 @@ class ExploreJsonFile(ContentTab):
             ("JSON Files (*.json *.JSON)")
         )[0]
 
+        if filepath == '':
+            return
+
         relpath = os.path.relpath(
             filepath,
             Config.getJsonPath()
         ).replace('.json', '').replace('.JSON', '')
 
-        Df = FileInteractions.loadDfFromFile(relpath, ftype='json')
-        self.tableWidget.buildFromDf(Df)
+        # cancel loading of previous file
+        if self.scanWorker is not None:
+            self.scanWorker.cancel()
+        for worker in self.columnWorkers.values():
+            worker.cancel()
+        self.columnWorkers = dict()
+
+        self.tableWidget.buildFromDf(None)
+        self.filenameLbl.setText('%s (loading...)' % relpath)
+
+        # columns are displayed as soon as they have been loaded
+        self.jsonReader = JsonColumnReader(filepath)
+        self.scanWorker = JsonScanWorker(self.jsonReader)
+        self.scanWorker.signals.progress.connect(
+            lambda columns, worker=self.scanWorker: self.scanProgress(worker, columns)
+        )
+        self.scanWorker.signals.finished.connect(
+            lambda columns, worker=self.scanWorker, relpath=relpath: self.scanFinished(worker, columns, relpath)
+        )
+        QtCore.QThreadPool.globalInstance().start(self.scanWorker)
 
+
+    def scanProgress(self, worker, columns):
+        # ignore columns of scans that have been cancelled in the meantime
+        if worker is not self.scanWorker:
+            return
+
+        self.tableWidget.dfModel.addColumns(columns)
+
+
+    def scanFinished(self, worker, columns, relpath):
+        if worker is not self.scanWorker:
+            return
+
+        if columns is not None:
+            self.tableWidget.dfModel.addColumns(columns)
         self.filenameLbl.setText(relpath)
+        self.scanWorker = None
+
+
+    def loadColumn(self, section):
+        '''
+        function loads an array-valued column (double-click on header) in the background
+        '''
+
+        dfModel = self.tableWidget.dfModel
+        if dfModel.isLoaded(section):
+            return
+
+        name = dfModel.columnName(section)
+        if name in self.columnWorkers:
+            return
+
+        worker = JsonColumnWorker(self.jsonReader, name)
+        worker.signals.finished.connect(
+            lambda series, worker=worker: self.columnLoaded(worker, series)
+        )
+        self.columnWorkers[name] = worker
+        QtCore.QThreadPool.globalInstance().start(worker)
+
+
+    def columnLoaded(self, worker, series):
+        if self.columnWorkers.get(worker.name) is not worker:
+            return
+
+        del self.columnWorkers[worker.name]
+        self.tableWidget.dfModel.setColumn(worker.name, series)
+        self.addDerivedColumns(worker.name)
+
+
+    def addDerivedColumns(self, name):
+        '''
+        function adds the columns that are derived from the loaded column name,
+        the sampling rate of its signal and further loaded columns (see Analysis.deriveResults)
+        '''
+
+        dfModel = self.tableWidget.dfModel
+        for suffix, (derivedSuffix, derive, argSuffixes) in Analysis.derivedColumns.items():
+            alias = name[:-len(suffix)]
+            if not name.endswith(suffix) or dfModel.column('%sDim' % alias) is None:
+                continue
+
+            derivedName = '%s%s' % (alias, derivedSuffix)
+            columns = [name, '%sDim' % alias, derivedName] + ['%s%s' % (alias, argSuffix) for argSuffix in argSuffixes]
+            Df = Analysis.deriveResults(pd.DataFrame(
+                {column: dfModel.column(column) for column in columns if dfModel.column(column) is not None}
+            ))
+            if derivedName in dfModel.dataFrame().columns:
+                dfModel.setColumn(derivedName, Df[derivedName])
+            else:
+                dfModel.addColumns({derivedName: Df[derivedName]})
@@ -1,3 +1,6 @@
+import Analysis
+from Base import Config
+from concurrent import futures
 import json
 import numpy as np
 from PyQt5 import QtCore, QtWidgets
@@ -13,58 +16,357 @@ from IPython import embed
 # SIGNAL PROCESSOR
 
 
-class SignalProcessor():
+class SignalProcessor(QtCore.QObject):
+
+    sigSignalsSet = QtCore.pyqtSignal()
+
+    # thread pool shared by all processors for per-signal parallel processing
+    _executor = None
 
     def __init__(self, rePro, series=None, ui=True):
+        super().__init__()
+
         self.rePro = rePro
         self.ui = ui
         self.defaultSigProcSetting = None
-        
+        self.series = None
+        self.signals = dict()
+        self.excludeTrial = 0
+
+        # currently pending background processing request
+        self._worker = None
+        # processed signals of recently visited and prefetched measurements
+        self._cache = utils.LRUCache(Config.signalCacheSize)
+        self._prefetchWorkers = dict()
+
         if self.ui:
             self.signalView = SignalView(self)
             self.widget = self.signalView.widget
 
         self.setSignals(series)
 
-            
+
     def setSignals(self, series):
-        self.series = series
-        if self.series is None:
+        '''
+        function processes all signals of the series in the calling thread
+        and displays them afterwards
+        '''
+
+        self.cancelProcessing()
+
+        if series is None:
+            self.series = None
             return
 
-        self.excludeTrial = 0 # by default: use trial
-        
-        # set signal data
-        self.signals = dict()
-        for alias, stype in zip(self.rePro.signalAliases, self.rePro.signalTypes):
+        self.applySignals(series, self.processSignals(series))
+
+
+    def setSignalsAsync(self, series):
+        '''
+        function processes all signals of the series in the background
+        and displays them (and emits sigSignalsSet) once they are done;
+        a previous request that has not finished yet is cancelled
+        '''
+
+        self.cancelProcessing()
+
+        if series is None:
+            self.series = None
+            return
+
+        key = self.cacheKey(series)
+
+        # measurement has been processed before
+        signals = self._cache.get(key)
+        if signals is not None:
+            self.applySignals(series, signals)
+            return
+
+        # measurement is currently being prefetched: wait for it
+        if key in self._prefetchWorkers:
+            self._worker = self._prefetchWorkers.pop(key)
+        else:
+            self._worker = self.startWorker(series, key, priority=1)
+
+        if self.ui:
+            self.signalView.setBusy(True)
+
+
+    def prefetch(self, seriesList):
+        '''
+        function processes the given series in the background
+        and keeps the results in the cache, so that displaying them
+        later on does not require processing them again.
+        Pending prefetches for series not in the list are cancelled
+        '''
+
+        keys = list()
+        for series in seriesList[:self._cache.maxSize-1]:
+            key = self.cacheKey(series)
+            keys.append(key)
+
+            if key in self._cache or key in self._prefetchWorkers:
+                continue
+            if self._worker is not None and self._worker.cacheKey == key:
+                continue
+
+            self._prefetchWorkers[key] = self.startWorker(series, key, priority=0)
+
+        for key in list(self._prefetchWorkers.keys()):
+            if key not in keys:
+                self._prefetchWorkers.pop(key).cancel()
+
+
+    def startWorker(self, series, key, priority=0):
+        worker = SignalProcessingWorker(self, series, key)
+        worker.signals.finished.connect(
+            lambda signals, worker=worker: self.processingFinished(worker, signals)
+        )
+        worker.signals.error.connect(
+            lambda msg, worker=worker: self.processingFailed(worker, msg)
+        )
+
+        QtCore.QThreadPool.globalInstance().start(worker, priority)
+
+        return worker
+
+
+    def cacheKey(self, series):
+        '''
+        measurements are identified by their position index
+        and the tool configurations they are processed with
+        '''
+
+        configs = list()
+        for alias in self.rePro.signalAliases:
+            config = self.rePro.getToolConfig(series, alias)
+            if isinstance(config, dict):
+                config = tuple(sorted(config.items()))
+            else:
+                config = None
+            configs.append(config)
+
+        return (series.name, tuple(configs))
+
+
+    def processingKey(self, series):
+        '''
+        function returns a key that identifies how the row 'series' is processed:
+        its raw signal windows (position, delay, sampling rates), the resolved
+        tool configurations and the signal dtype. Stored results of a row
+        are valid as long as its key does not change.
+        Numbers are formatted, so that keys survive the JSON save files
+        and do not depend on the numpy scalar types
+        '''
+
+        def canonical(val):
+            if isinstance(val, dict):
+                return tuple(sorted((key, canonical(v)) for key, v in val.items()))
+            if isinstance(val, (int, float, np.integer, np.floating)) and not isinstance(val, (bool, np.bool_)):
+                if float(val).is_integer():
+                    return '%d' % val
+                return '%.10g' % val
+            return val
+
+        window = [canonical(series.name), canonical(series.get('delay'))]
+        window += [canonical(series.get('%sDim' % alias)) for alias in self.rePro.signalAliases]
+        configs = [canonical(self.rePro.getToolConfig(series, alias)) for alias in self.rePro.signalAliases]
+
+        return repr((tuple(window), tuple(configs), str(Config.signalDtype)))
+
+
+    def clearCache(self):
+        for worker in self._prefetchWorkers.values():
+            worker.cancel()
+        self._prefetchWorkers = dict()
+        self._cache.clear()
+
+
+    def cacheBytes(self):
+        '''
+        function returns the memory held by the filtered signals
+        of all cached measurements [bytes]
+        '''
+
+        return sum(
+            signalData.signal.nbytes
+            for signals in self._cache.values() for signalData in signals.values()
+        )
+
+
+    def cancelProcessing(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+        if self.ui:
+            self.signalView.setBusy(False)
+
+
+    def processingFinished(self, worker, signals):
+        if self._prefetchWorkers.get(worker.cacheKey) is worker:
+            del self._prefetchWorkers[worker.cacheKey]
+
+        if signals is not None:
+            self._cache.set(worker.cacheKey, signals)
+
+        # ignore results of requests that have been superseded in the meantime
+        if worker is not self._worker:
+            return
+
+        self._worker = None
+        self.applySignals(worker.series, signals)
+
+
+    def processingFailed(self, worker, msg):
+        if self._prefetchWorkers.get(worker.cacheKey) is worker:
+            del self._prefetchWorkers[worker.cacheKey]
+
+        if worker is not self._worker:
+            return
+
+        print('WARNING: Signal processing failed (%s)' % msg)
+        self.cancelProcessing()
+
+
+    def processSignals(self, series, worker=None, parallel=None):
+        '''
+        function filters all signals of the series, calculates their PSDs
+        and runs the peak detection without touching any widgets,
+        so it may be called from a worker thread.
+        If <bool> parallel (default: Config.parallelSignalProcessing) is set,
+        the signals are processed concurrently in a thread pool
+
+        returns None if the worker has been cancelled in the meantime
+        '''
+
+        if parallel is None:
+            parallel = Config.parallelSignalProcessing
+
+        def isCancelled():
+            return worker is not None and worker.isCancelled()
+
+        signalTypes = list(zip(self.rePro.signalAliases, self.rePro.signalTypes))
+
+        if parallel:
+            pending = {
+                alias: self.getExecutor().submit(self.processSignal, series, alias, stype, isCancelled)
+                for alias, stype in signalTypes
+            }
+            signals = {alias: pending[alias].result() for alias, stype in signalTypes}
+        else:
+            signals = dict()
+            for alias, stype in signalTypes:
+                signals[alias] = self.processSignal(series, alias, stype, isCancelled)
+
+        if isCancelled() or None in signals.values():
+            return None
+
+        return signals
+
+
+    def processSignal(self, series, alias, stype, isCancelled=None):
+        '''
+        function runs the processing pipeline for a single signal of the series
+        returns None if processing has been cancelled before it started
+        '''
+
+        if isCancelled is not None and isCancelled():
+            return None
+
+        signalData = self.detectPeaks(series, alias, stype, Config.signalDtype)
+
+        # compare detection with the float64 path
+        if Config.checkSignalDtype and signalData.signal.dtype != np.float64:
+            refSignalData = self.referencePeaks(series, alias, stype)
+            if refSignalData is None:
+                print('WARNING: float64 check skipped, %s was not loaded from file (%s // %s)' % (
+                    alias, self.rePro.id(), str(series.name)
+                ))
+            else:
+                deviation = Analysis.unmatchedPeaks(signalData.tool.peakIndices, refSignalData.tool.peakIndices)
+                if deviation > Config.signalDtypeTolerance:
+                    print('WARNING: %.1f%% of %s peaks deviate from float64 detection (%s // %s)' % (
+                        100*deviation, alias, self.rePro.id(), str(series.name)
+                    ))
+
+        # tools created in a worker thread have to live in the GUI thread
+        utils.moveToMainThread(signalData.tool)
 
+        return signalData
+
+
+    def referencePeaks(self, series, alias, stype):
+        '''
+        function runs the peak detection on the signal as read from the file in float64
+        (not upcast from signalDtype, whose rounding would be carried into the reference)
+        returns None if the signal of the series has not been loaded from the file
+        '''
+
+        rawSignal = self.rePro.rawSignal(series.name, alias)
+        if rawSignal is None:
+            return None
+
+        rawSeries = series.copy()
+        rawSeries[alias] = rawSignal
+
+        return self.detectPeaks(rawSeries, alias, stype, np.float64)
+
+
+    def detectPeaks(self, series, alias, stype, dtype):
+        '''
+        function filters the signal with alias alias of the series
+        (as dtype) and runs the peak detection
+        '''
+
+        useFilter = True
+        #useFilter = False
+        if stype == 'neuronal':
             useFilter = True
-            #useFilter = False
-            if stype == 'neuronal':
-                useFilter = True
-            
-            # set signal data
-            self.signals[alias] = SignalData(
-                alias,
-                stype,
-                self.series[alias],
-                self.series['%sDim' % alias], 
-                useFilter=useFilter
+
+        # set signal data
+        signalData = SignalData(
+            alias,
+            stype,
+            np.asarray(series[alias], dtype=dtype),
+            series['%sDim' % alias],
+            useFilter=useFilter
+        )
+
+        # check if previous configurations (row or RePro defaults) exist for signal processing
+        config = self.rePro.getToolConfig(series, alias)
+        if config is not None:
+            signalData.setSignalConfig(config)
+        elif stype == 'eod':
+            signalData.setSignalConfig(
+                {signalData.tool.threshFactorN: 0.25}
             )
-                
-            # check if previous configurations exist for signal processing
-            if '%s_toolconfig' % alias in series.index:
-                config = self.series['%s_toolconfig' % alias]
-                if isinstance(config, dict):
-                    self.signals[alias].setSignalConfig(config)
-            elif stype == 'eod':
-                self.signals[alias].setSignalConfig(
-                    {self.signals[alias].tool.threshFactorN: 0.25}
-                )
-                    
-            
-            # run main analysis function of selected tool by default
-            self.signals[alias].tool.run()
+
+
+        # run main analysis function of selected tool by default
+        signalData.tool.run()
+
+        return signalData
+
+
+    @classmethod
+    def getExecutor(cls):
+        if cls._executor is None:
+            cls._executor = futures.ThreadPoolExecutor(
+                max_workers=Config.signalProcessingThreads,
+                thread_name_prefix='SignalProcessor'
+            )
+        return cls._executor
+
+
+    def applySignals(self, series, signals):
+        if signals is None:
+            return
+
+        self.series = series
+        self.signals = signals
+
+        self.excludeTrial = 0 # by default: use trial
 
         # overwrite exclude flag if set
         if 'excludeTrial' in series.index and series['excludeTrial'] is not None:
@@ -72,36 +374,32 @@ class SignalProcessor():
 
         # provide view with signal data
         if self.ui:
+            self.signalView.setBusy(False)
             self.signalView.setSignals(self.signals)
             self.signalView.checkExcludeTrial.setCheckState(QtCore.Qt.CheckState(self.excludeTrial))
 
-            
-    def sigRunCompleteConnect(self, fun):
-        for alias in self.rePro.signalAliases:
-            self.signals[alias].tool.sigRunComplete.connect(fun)
+        self.sigSignalsSet.emit()
+
 
-            
     def useCurrentSettingsAsDefault(self):
-        
+
+        # processed measurements are invalidated by the new defaults
+        self.clearCache()
+
         # get current config parameters
         defaultSeries = self.getProcessedData()
-        configKeys = [key for key in defaultSeries.index if key.endswith('_toolconfig')]
-        
+        configKeys = ['%s_toolconfig' % alias for alias in self.rePro.signalAliases]
+
         print('New default settings:\n%s' % str(defaultSeries[configKeys]))
 
-        # add columns to Df if they dont exist yet
-        for key in configKeys:
-            if key not in self.rePro.data().columns:
-                self.rePro._data.loc[:,key] = None
-
-        # add configuration parameters to each row of Df
-        for posIdx, series in self.rePro.data().iterrows():
-            # set new config parameters and RESET series to force re-evaluation
-            series[configKeys] = defaultSeries[configKeys]
-            series['additionalData'] = False
-            self.rePro.setData(series, additionalData=False)
-            
-        
+        # store configuration parameters once for the RePro
+        for alias, key in zip(self.rePro.signalAliases, configKeys):
+            self.rePro.setDefaultToolConfig(alias, defaultSeries[key])
+
+        # remove row configurations and RESET rows to force re-evaluation
+        self.rePro.resetToolConfigs()
+
+
     def getProcessedData(self):
         '''
         packs processed data into original series object and returns it
@@ -121,10 +419,79 @@ class SignalProcessor():
             self.series['%s_toolconfig' % alias] = self.signals[alias].tool.getConfigParams()
 
         self.series['excludeTrial'] = self.excludeTrial
+        # rows are keyed by ContentTab.saveBatchData only (rows saved by hand have no key)
+        self.series['processingKey'] = None
             
         return self.series
 
 
+################
+# WORKER
+
+class SignalProcessingWorker(utils.Worker):
+
+    def __init__(self, signalProcessor, series, cacheKey=None):
+        super().__init__()
+        self.signalProcessor = signalProcessor
+        self.series = series
+        self.cacheKey = cacheKey
+
+
+    def work(self):
+        return self.signalProcessor.processSignals(self.series, worker=self)
+
+
+################
+# TIME AXIS
+
+class TimeAxis():
+    '''
+    implicit time axis of a regularly sampled signal
+    times are calculated on demand from start time, sampling rate and
+    number of samples instead of being stored for every sample
+    '''
+
+    def __init__(self, n, Fs, start=0.):
+        self.n = n
+        self.Fs = Fs
+        self.start = start
+
+
+    def __len__(self):
+        return self.n
+
+
+    @property
+    def shape(self):
+        return (self.n,)
+
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return self.start + np.arange(*idx.indices(self.n))/self.Fs
+
+        idx = np.asarray(idx)
+        if np.any(idx >= self.n) or np.any(idx < -self.n):
+            raise IndexError('index out of bounds for time axis with %i samples' % self.n)
+
+        return self.start + np.where(idx < 0, idx + self.n, idx)/self.Fs
+
+
+    def __array__(self, dtype=None, copy=None):
+        times = self[:]
+        if dtype is not None:
+            times = times.astype(dtype)
+        return times
+
+
+    def index(self, times):
+        '''
+        function returns the sample indices closest to the given times
+        '''
+
+        return np.round((np.asarray(times) - self.start)*self.Fs).astype(int)
+
+
 ################
 # SIGNAL DATA
 
@@ -144,7 +511,7 @@ class SignalData():
 
     def setSignalData(self, sig, Fs, useFilter=False):
 
-        self.time = np.arange(0, sig.shape[0])/Fs
+        self.time = TimeAxis(sig.shape[0], Fs)
         self.signal = sig
         self.Fs = Fs
 
@@ -154,20 +521,23 @@ class SignalData():
             else:
                 self.filterSignal()
 
-        self.tool.setSignalData(self.signal, self.Fs)
+        self.tool.setSignalData(self.signal, self.Fs, time=self.time)
             
 
     def filterSignal(self, btype='highpass', Wn=[50]):
+        # filtered signal keeps the dtype of the raw signal
+        dtype = self.signal.dtype if self.signal.dtype.kind == 'f' else np.float64
+
         # pad signal
         padLen = int(np.round(0.05*len(self.signal)))        
         self.signal = np.concatenate((
-            np.ones(padLen)*np.mean(self.signal[:padLen]),
+            np.full(padLen, np.mean(self.signal[:padLen]), dtype=dtype),
             self.signal,
-            np.ones(padLen)*np.mean(self.signal[-padLen:]),
-        ))
+            np.full(padLen, np.mean(self.signal[-padLen:]), dtype=dtype),
+        )).astype(dtype, copy=False)
         #filter
         b, a = spSig.butter(N=2, Wn=np.array(Wn)/(self.Fs/2), btype=btype)
-        self.signal = spSig.filtfilt(b, a, self.signal)
+        self.signal = spSig.filtfilt(b.astype(dtype), a.astype(dtype), self.signal)
         # remove padding
         self.signal = self.signal[padLen:-padLen]
 
@@ -189,6 +559,9 @@ class SignalView():
         
         self.excludeTrial = 0
 
+        # tool UIs are created once per signal alias and rebound to the tools of each measurement
+        self.toolUis = dict()
+
         # setup layout
         self.widget = QtWidgets.QWidget()
         self.layout = QtWidgets.QGridLayout()
@@ -217,6 +590,13 @@ class SignalView():
         self.toolWidget.setLayout(self.toolWidgetLayout)
         self.layout.addWidget(self.toolWidget, 1, 1)
         self.layout.setColumnStretch(1, 1)
+
+        # busy indicator for background processing
+        self.busyIndicator = QtWidgets.QProgressBar()
+        self.busyIndicator.setRange(0, 0)
+        self.busyIndicator.setFormat('Processing...')
+        self.busyIndicator.setVisible(False)
+        self.layout.addWidget(self.busyIndicator, 2, 0, 1, 2)
         
         # create signal figure widget and add to layout
         self.figure = utils.FigureWidget(labels={'bottom': 'Time [s]', 'left': 'Amplitude [mV]'})
@@ -236,27 +616,31 @@ class SignalView():
     def updateExcludeTrial(self, state):
         self.signalProcessor.excludeTrial = state
 
+
+    def setBusy(self, busy):
+        self.busyIndicator.setVisible(busy)
+        self.toolWidget.setDisabled(busy)
+
     
     def setSignals(self, signals):
-        # hide all old tool UIs to correctly display plots
-        if self.signals is not None:
-            for alias in signals.keys():
-                self.signals[alias].tool.ui.widget.setVisible(False)
+        # hide all tool UIs to correctly display plots
+        for toolUi in self.toolUis.values():
+            toolUi.widget.setVisible(False)
         
         self.signals = signals
 
-        # remove previous toolboxes
-        for i in list(range(self.toolWidgetLayout.count()))[::-1]:
-            self.toolWidgetLayout.itemAt(i).widget().deleteLater()
-    
-        # update signal list and set toolbox display options
+        # update signal list and bind tool UIs to the new tools
         self.signalListWidget.clear()
         for alias in signals.keys():
-            self.signals[alias].tool.setupUi(peakPlotDataItem=self.peakPlotDataItem)
+            tool = self.signals[alias].tool
+            if alias in self.toolUis:
+                self.toolUis[alias].bindTool(tool)
+            else:
+                self.toolUis[alias] = SignalToolUi(tool, self.peakPlotDataItem)
+                self.toolWidgetLayout.addWidget(self.toolUis[alias].widget)
+                self.toolUis[alias].widget.setVisible(False)
             
             self.signalListWidget.addItem(QtWidgets.QListWidgetItem(alias))
-            self.toolWidgetLayout.addWidget(self.signals[alias].tool.ui.widget)
-            self.signals[alias].tool.ui.widget.setVisible(False)
 
         self.signalListWidget.setCurrentRow(0)
         self.signalSelected(self.signalListWidget.item(0))
@@ -264,9 +648,8 @@ class SignalView():
             
     def signalSelected(self, item):
         # hide all toolboxes
-        for key in self.signals.keys():
-            signalData = self.signals[key]
-            signalData.tool.ui.widget.setVisible(False)
+        for toolUi in self.toolUis.values():
+            toolUi.widget.setVisible(False)
             
         # show newly selected toolboxes
         signalData = self.signals[item.text()]
@@ -276,7 +659,7 @@ class SignalView():
         signalData.tool.ui.plotHistogram()
         
         # plot signal
-        self.signalPlotDataItem.setData(signalData.time, signalData.signal)
+        self.signalPlotDataItem.setData(signalData.time[:], signalData.signal)
         # plot PSD
         self.powerPlotDataItem.setData(
             signalData.tool.PSDfreq[signalData.tool.PSDfreq < 1000],
@@ -317,10 +700,6 @@ class SignalTool(QtCore.QObject):
         self.name = 'signalTool'
         
         
-    def setupUi(self, peakPlotDataItem=None):
-        self.ui = SignalToolUi(self, peakPlotDataItem)
-
-
     def setConfigParams(self, config):
         if self.threshFactorN in config.keys():
             self.updateThresholdFactor(config[self.threshFactorN])
@@ -378,19 +757,26 @@ class SignalTool(QtCore.QObject):
             self.ui.updateSkipPeakOffset()
 
             
-    def setSignalData(self, signal, Fs):
-        self.time = np.arange(0, signal.shape[0])/Fs
+    def setSignalData(self, signal, Fs, time=None):
+        # share the time axis of the signal data if provided
+        if time is None:
+            time = TimeAxis(signal.shape[0], Fs)
+        self.time = time
         self.signal = signal
         self.Fs = Fs
 
+        # envelopes depend on signal and peaks
+        self._envelopes = dict()
+
         # set defaults
         self.updateThresholdFactor(0.4)
         self.updateTau(20)
         self.updateSkipPeaks(0)
         self.updateSkipPeakOffset(0)
 
-        # calculate PSD
-        params = dict(fs=self.Fs, nperseg=2**14, noverlap=2**13)
+        # calculate PSD (segments are shortened to the length of short signals)
+        self.PSDnperseg = min(2**14, self.signal.shape[0])
+        params = dict(fs=self.Fs, nperseg=self.PSDnperseg, noverlap=self.PSDnperseg//2)
         freq, Pxx = spSig.csd(self.signal, self.signal, **params)
         self.PSDfreq = freq[freq <= 2000]
         self.PSD = Pxx[freq <= 2000]
@@ -411,6 +797,7 @@ class SignalTool(QtCore.QObject):
             
         self.peakTimes = self.time[self.peakIndices.astype(int)]
         self.peakAmps = self.signal[self.peakIndices.astype(int)]
+        self._envelopes = dict()
         
         if self.ui is not None:
             self.ui.plotPeaks()
@@ -419,13 +806,39 @@ class SignalTool(QtCore.QObject):
         self.sigRunComplete.emit()
 
 
+    def getEnvelope(self, envFs, tEnd, method='peaks'):
+        '''
+        function returns the envelope of the signal (sampled at envFs up to tEnd),
+        extracted from the detected peaks (method 'peaks') or by Hilbert transform
+        (method 'hilbert'); envelopes are cached until the next detection run
+        '''
+
+        key = (envFs, tEnd, method)
+        if key not in self._envelopes:
+            self._envelopes[key] = Analysis.extractEnvelope(
+                Analysis.envelopeTime(tEnd, envFs),
+                peakTimes=self.peakTimes,
+                peakAmps=self.peakAmps,
+                signal=self.signal,
+                Fs=self.Fs,
+                method=method
+            )
+
+        return self._envelopes[key]
+
+
     def getProcessedData(self):
+        '''
+        function returns the results that are stored for a measurement;
+        peak times and PSD frequencies are derived from the peak indices,
+        the PSD segment length and the sampling rate on read (see Analysis.deriveResults)
+        '''
+
         return dict(
-            PeakIdcs=self.peakIndices,
-            PeakTimes=self.peakTimes,
-            PeakAmps=self.peakAmps,
-            PSDfreq=self.PSDfreq,
-            PSD=self.PSD
+            PeakIdcs=self.peakIndices.astype(np.int32),
+            PeakAmps=self.peakAmps.astype(np.float32),
+            PSD=self.PSD.astype(np.float32),
+            PSDnperseg=self.PSDnperseg
         )
 
 
@@ -438,22 +851,46 @@ class SignalToolUi(QtCore.QObject):
     def __init__(self, tool, peakPlotDataItem):
         super().__init__()
 
-        self.tool = tool
+        self.tool = None
         self.peakPlotDataItem = peakPlotDataItem
 
         self.setupUi()
 
+        self.bindTool(tool)
+
+
+    def bindTool(self, tool):
+        '''
+        function (re)binds the ui to a tool and displays its parameters;
+        inputs are updated without feeding the values back to the tool
+        '''
+
+        if self.tool is not None and self.tool is not tool and self.tool.ui is self:
+            self.tool.ui = None
+        self.tool = tool
+        self.tool.ui = self
+
+        self.widget.setTitle(self.tool.name)
+
+        inputs = [self.inputThreshFactor, self.inputMinThresh, self.inputTau,
+                  self.checkSkipPeaks, self.inputSkipPeakOffset]
+        for widget in inputs:
+            widget.blockSignals(True)
+
         self.updateThresholdFactor()
         self.updateMinThreshold()
         self.updateTau()
         self.updateSkipPeaks()
         self.updateSkipPeakOffset()
+
+        for widget in inputs:
+            widget.blockSignals(False)
         
         self.btnDetectPeaks.setStyleSheet('color:#000000')
         
 
     def setupUi(self):
-        self.widget = QtWidgets.QGroupBox(self.tool.name)
+        self.widget = QtWidgets.QGroupBox()
         self.layout = QtWidgets.QGridLayout()
         self.widget.setLayout(self.layout)
         self.widget.setMaximumHeight(300)
@@ -467,7 +904,7 @@ class SignalToolUi(QtCore.QObject):
         self.layout.addWidget(QtWidgets.QLabel('<b>Thresh. factor [0,1]:<b> '), 1, 0)
         self.inputThreshFactor = QtWidgets.QDoubleSpinBox()
         self.inputThreshFactor.setSingleStep(0.01)
-        self.inputThreshFactor.valueChanged.connect(self.tool.updateThresholdFactor)
+        self.inputThreshFactor.valueChanged.connect(lambda val: self.tool.updateThresholdFactor(val))
         self.layout.addWidget(self.inputThreshFactor, 1, 1)
         
         # input mininum threshold
@@ -475,7 +912,7 @@ class SignalToolUi(QtCore.QObject):
         self.inputMinThresh = QtWidgets.QDoubleSpinBox()
         self.inputMinThresh.setMinimum(0.05)
         self.inputMinThresh.setSingleStep(0.1)
-        self.inputMinThresh.valueChanged.connect(self.tool.updateMinThreshold)
+        self.inputMinThresh.valueChanged.connect(lambda val: self.tool.updateMinThreshold(val))
         self.inputMinThresh.setDisabled(True)
         self.layout.addWidget(self.inputMinThresh, 2, 1)
 
@@ -484,12 +921,12 @@ class SignalToolUi(QtCore.QObject):
         self.inputTau = QtWidgets.QDoubleSpinBox()
         self.inputTau.setMinimum(0.1)
         self.inputTau.setSingleStep(0.1)
-        self.inputTau.valueChanged.connect(self.tool.updateTau)
+        self.inputTau.valueChanged.connect(lambda val: self.tool.updateTau(val))
         self.layout.addWidget(self.inputTau, 3, 1)
 
         # check skip peak
         self.checkSkipPeaks = QtWidgets.QCheckBox('Skip 2nd peaks / offset: ')
-        self.checkSkipPeaks.stateChanged.connect(self.tool.updateSkipPeaks)
+        self.checkSkipPeaks.stateChanged.connect(lambda state: self.tool.updateSkipPeaks(state))
         self.layout.addWidget(self.checkSkipPeaks, 4, 0)
                 
         # input mininum threshold
@@ -497,7 +934,7 @@ class SignalToolUi(QtCore.QObject):
         self.inputSkipPeakOffset.setMinimum(0)
         self.inputSkipPeakOffset.setMaximum(1)
         self.inputSkipPeakOffset.setSingleStep(1)
-        self.inputSkipPeakOffset.valueChanged.connect(self.tool.updateSkipPeakOffset)
+        self.inputSkipPeakOffset.valueChanged.connect(lambda val: self.tool.updateSkipPeakOffset(val))
         self.layout.addWidget(self.inputSkipPeakOffset, 4, 1)
         
         # detect peaks button
@@ -124,7 +124,7 @@ class NaviDatasets():
             entry = entry.replace('.nix', '')
                         
             # open file
-            nixFile = nixlacs.RelacsFile(Config.getDataPath(entry), Config.getJsonPath())
+            nixFile = nixlacs.RelacsFile(Config.getDataPath(entry), Config.getJsonPath(), signalDtype=Config.signalDtype)
 
             # quality
             recQuality = nixFile.metadata()['Recording']['Recording quality'][0].lower()
@@ -241,6 +241,7 @@ class NaviSubjects():
             self.listRePros.addItem(QtWidgets.QListWidgetItem(reProName))
 
     def openAllRePros(self):
+        # content tabs are only built when they are activated for the first time
         for i in range(self.listRePros.count()):
             reProItem = self.listRePros.item(i)
             print('Opening RePro %s' % reProItem.text())
@@ -274,7 +275,7 @@ class NaviSubjects():
             entry = entry.replace('.nix', '')
             
             # open file
-            nixFile = nixlacs.RelacsFile(Config.getDataPath(entry), Config.getJsonPath())
+            nixFile = nixlacs.RelacsFile(Config.getDataPath(entry), Config.getJsonPath(), signalDtype=Config.signalDtype)
                 
             # missing identifiers for january recordings:
             #subject = nixFile.metadata()['Recording']['Subject']['Identifier'].lower()
@@ -0,0 +1,71 @@
+# latency benchmark for the signal processing of single measurements
+## usage: python benchmark.py <nix file path without extension> [number of trials per RePro]
+
+from Base import Config
+from CustomWidgets import SignalProcessor
+import nixlacs
+import numpy as np
+import sys
+import time
+
+
+def benchmarkRePro(rePro, trialNum):
+    '''
+    function processes up to trialNum measurements of the rePro
+    sequentially and in parallel mode and returns the latencies [s]
+    '''
+
+    rePro.loadSignals()
+    if rePro.data().shape[0] == 0:
+        return None
+
+    signalProcessor = SignalProcessor(rePro, ui=False)
+    posIdcs = rePro.data().index[:trialNum]
+
+    # warm up (thread pool startup, filter design caches)
+    signalProcessor.processSignals(rePro.data(posIdcs[0]), parallel=True)
+
+    latencies = dict()
+    for parallel in [False, True]:
+        latencies[parallel] = list()
+        for posIdx in posIdcs:
+            series = rePro.data(posIdx)
+            startTime = time.perf_counter()
+            signalProcessor.processSignals(series, parallel=parallel)
+            latencies[parallel].append(time.perf_counter() - startTime)
+
+    return latencies
+
+
+if __name__ == '__main__':
+    filepath = sys.argv[1]
+    trialNum = 10
+    if len(sys.argv) > 2:
+        trialNum = int(sys.argv[2])
+
+    rFile = nixlacs.RelacsFile(filepath, '.', signalDtype=Config.signalDtype)
+
+    print('Threads: %i' % Config.signalProcessingThreads)
+    print('Signal dtype: %s' % Config.signalDtype)
+    print('%-26s %6s %12s %12s %8s' % ('RePro', 'Trials', 'Serial [ms]', 'Parallel [ms]', 'Speedup'))
+
+    benchmarkedClasses = list()
+    for rePro in rFile.rePros():
+        reProName = rePro.__class__.__name__
+
+        # one RePro per RePro type
+        if reProName in benchmarkedClasses:
+            continue
+
+        latencies = benchmarkRePro(rePro, trialNum)
+        if latencies is None:
+            continue
+        benchmarkedClasses.append(reProName)
+
+        serial = np.median(latencies[False])*1000
+        parallel = np.median(latencies[True])*1000
+        print('%-26s %6i %12.1f %12.1f %8.2f' % (
+            reProName, len(latencies[False]), serial, parallel, serial/parallel
+        ))
+
+    rFile.close()
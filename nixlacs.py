@@ -1,6 +1,9 @@
 # nixlacs scipt for opening and organizing nix files that re produced by RELACS
 ## Tim Hladnik
 
+import Analysis
+import copy
+import json
 import nixio as nix
 import numpy as np
 import os
@@ -21,6 +24,103 @@ def getMetadataDict(metadata):
 
 
 
+################################################################
+# RAGGED ARRAYS
+
+class RaggedArray():
+    '''
+    variable-length 1d arrays of several rows stored in one flat buffer:
+    row i is values[offsets[i]:offsets[i+1]] (None if valid[i] is False);
+    rows are returned as views into the buffer without copying
+    '''
+
+    def __init__(self, values, offsets, valid=None):
+        self.values = np.asarray(values)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        if valid is None:
+            valid = np.ones(self.offsets.shape[0]-1, dtype=bool)
+        self.valid = np.asarray(valid, dtype=bool)
+
+
+    @classmethod
+    def fromArrays(cls, arrays, dtype=None):
+        '''
+        function packs a sequence of arrays (or None for missing rows) into a RaggedArray
+        '''
+
+        valid = np.array([isinstance(arr, (list, np.ndarray)) for arr in arrays], dtype=bool)
+        rows = [np.asarray(arr, dtype=dtype) for arr, isValid in zip(arrays, valid) if isValid]
+
+        lengths = np.zeros(valid.shape[0], dtype=np.int64)
+        lengths[valid] = [row.shape[0] for row in rows]
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+
+        if len(rows) > 0:
+            values = np.concatenate(rows)
+        else:
+            values = np.zeros(0, dtype=dtype if dtype is not None else float)
+
+        return cls(values, offsets, valid)
+
+
+    def __len__(self):
+        return self.valid.shape[0]
+
+
+    def __getitem__(self, i):
+        if not self.valid[i]:
+            return None
+        return self.values[self.offsets[i]:self.offsets[i+1]]
+
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+
+    def rowIndices(self):
+        '''
+        function returns the row index of every value
+        '''
+
+        return np.repeat(np.arange(len(self)), self.lengths())
+
+
+    def rows(self):
+        return [self[i] for i in range(len(self))]
+
+
+    def take(self, idcs):
+        '''
+        function returns the rows idcs as a new RaggedArray
+        '''
+
+        idcs = np.asarray(idcs, dtype=np.int64)
+        lengths = self.lengths()[idcs]
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        positions = np.repeat(self.offsets[idcs] - offsets[:-1], lengths) + np.arange(offsets[-1])
+
+        return RaggedArray(self.values[positions], offsets, self.valid[idcs])
+
+
+def isRaggedColumn(values):
+    '''
+    function checks whether all entries of a column are either missing
+    or numeric 1d arrays (with at least one array)
+    '''
+
+    hasArrays = False
+    for val in values:
+        if isinstance(val, (list, np.ndarray)):
+            arr = np.asarray(val)
+            if arr.ndim != 1 or (arr.shape[0] > 0 and arr.dtype.kind not in 'biuf'):
+                return False
+            hasArrays = True
+        elif val is not None and not (isinstance(val, float) and np.isnan(val)):
+            return False
+
+    return hasArrays
+
+
 ################################################################
 # REPRO
 
@@ -41,8 +141,19 @@ class RePro():
             self.relacsFile.savetype
         )
 
-        # open save file or create new Df to be saved
-        self.openSaveFile()
+        # save file (Df to be saved and the signal tool configurations for all rows
+        # without their own configuration) is opened on first access (see data())
+        self._data = None
+        self._defaultToolConfigs = dict()
+
+        # number of modifications made through setData per (row, column) (see dataVersion)
+        self._dataVersions = dict()
+
+        # packed array-valued columns (see ragged())
+        self._raggedColumns = dict()
+
+        # sample window of each loaded signal in its reference (see rawSignal)
+        self._referenceWindows = dict()
 
         # tag (tags mark the start of a RePro
         self._tagData = self.relacsFile.b().tags[self.id()]
@@ -85,17 +196,131 @@ class RePro():
 
 
     def openSaveFile(self):
-        self._data = self.relacsFile.openSaveFile(self.savename)
+        self._data = Analysis.deriveResults(self.relacsFile.openSaveFile(self.savename))
+        self._defaultToolConfigs = self.relacsFile.openToolConfigFile(self.savename)
+
+        # stored array-valued columns are only held in packed buffers
+        # (derived ones are not, PSD frequencies share one array per sampling rate)
+        derivedSuffixes = tuple(derivedSuffix for derivedSuffix, derive, argSuffixes in Analysis.derivedColumns.values())
+        self._raggedColumns = dict()
+        for column in self._data.columns:
+            if str(column).endswith(derivedSuffixes):
+                continue
+            if self._data[column].dtype == object and isRaggedColumn(self._data[column].values):
+                self.ragged(column)
+
+
+    def ragged(self, column):
+        '''
+        function returns an array-valued column as RaggedArray (rows as in self.data());
+        the cells of the column are replaced by views into the packed buffer,
+        so that the values are held only once
+        '''
+
+        if column not in self._raggedColumns:
+            ragged = RaggedArray.fromArrays(self._data[column].values)
+            self._data[column] = pd.Series(ragged.rows(), index=self._data.index, dtype=object)
+            self._raggedColumns[column] = ragged
+
+        return self._raggedColumns[column]
+
+
+    def signalsLoaded(self):
+        return self._data is not None and all(alias in self._data.columns for alias in self.signalAliases)
+
+
+    def loadCopy(self):
+        '''
+        function opens the save file (unless it is open already) and loads the signals
+        into a copy of the RePro which it returns; the RePro itself is not modified,
+        so that it may be called from a worker thread (see mergeCopy)
+        '''
+
+        loader = copy.copy(self)
+        loader._dataVersions = dict()
+        loader._raggedColumns = dict()
+        loader._referenceWindows = dict(self._referenceWindows)
+        if self._data is None:
+            loader.openSaveFile()
+        else:
+            loader._data = self._data.copy()
+        loader.loadSignals()
+
+        return loader
+
+
+    def mergeCopy(self, loader):
+        '''
+        function adds the save file, the signals and all other new rows and columns
+        of a copy returned by loadCopy to the RePro
+        '''
+
+        self._referenceWindows.update(loader._referenceWindows)
+
+        if self._data is None:
+            self._data = loader._data
+            self._defaultToolConfigs = loader._defaultToolConfigs
+            self._raggedColumns = loader._raggedColumns
+            return
+
+        Df = loader._data
+        newIdcs = Df.index.difference(self._data.index)
+        if len(newIdcs) > 0:
+            self._data = pd.concat([self._data, Df.loc[newIdcs, Df.columns.intersection(self._data.columns)]])
+            self._raggedColumns = dict()
+
+        signalColumns = self.signalAliases + ['%sDim' % alias for alias in self.signalAliases]
+        for column in Df.columns:
+            if column in signalColumns or column not in self._data.columns:
+                self._data[column] = Df[column]
+                self._raggedColumns.pop(column, None)
+                for rowIdx in Df.index:
+                    key = (rowIdx, column)
+                    self._dataVersions[key] = self._dataVersions.get(key, 0) + 1
+
+
+    def signalBytes(self):
+        '''
+        function returns the memory held by the raw signals [bytes]
+        '''
+
+        nbytes = 0
+        if self._data is None:
+            return nbytes
+
+        for alias in self.signalAliases:
+            if alias in self._data.columns:
+                nbytes += sum(sig.nbytes for sig in self._data[alias].values if isinstance(sig, np.ndarray))
+        return nbytes
+
+
+    def releaseSignals(self):
+        '''
+        function removes the raw signals from the Df
+        (processed data is kept; signals can be reloaded with loadSignals)
+        '''
+
+        if self._data is None:
+            return
+
+        columns = [alias for alias in self.signalAliases if alias in self._data.columns]
+        self._data = self._data.drop(columns=columns)
+        for column in columns:
+            self._raggedColumns.pop(column, None)
 
 
     def writeToSaveFile(self):
         # remove raw signals to avoid redundancies and SAVE STORAGE SPACE
-        data = self.data().drop(self.signalAliases, axis='columns')
+        data = self.data().drop(self.signalAliases, axis='columns', errors='ignore')
         data = data[data.additionalData == True]
         self.relacsFile.writeToSaveFile(data, self.savename)
+        self.relacsFile.writeToolConfigFile(self._defaultToolConfigs, self.savename)
 
 
     def data(self, rowIdx=None):
+        if self._data is None:
+            self.openSaveFile()
+
         if rowIdx is None:
             return self._data
         else:
@@ -118,14 +343,95 @@ class RePro():
         if additionalData:
             series['additionalData'] = True
 
+        # derived peak times and PSD frequencies (from the series or the row it replaces)
+        def rowValue(column):
+            if column in series.index:
+                return series[column]
+            if column in self.data().columns and series.name in self._data.index:
+                return self._data.at[series.name, column]
+            return None
+
+        for alias in self.signalAliases:
+            for suffix, (derivedSuffix, derive, argSuffixes) in Analysis.derivedColumns.items():
+                if '%s%s' % (alias, suffix) not in series.index:
+                    continue
+                args = [rowValue('%sDim' % alias)] + [rowValue('%s%s' % (alias, argSuffix)) for argSuffix in argSuffixes]
+                series['%s%s' % (alias, derivedSuffix)] = derive(series['%s%s' % (alias, suffix)], *args)
+
         # add missing keys to Df
         for idx in series.index:
             if idx not in self.data().columns:
                 self._data[idx] = None
 
+        # packed columns are outdated (all of them if a row is added)
+        if series.name not in self._data.index:
+            self._raggedColumns = dict()
+        for idx in series.index:
+            self._raggedColumns.pop(idx, None)
+
         # set data
         self._data.loc[series.name, series.index] = series
 
+        for column in series.index:
+            key = (series.name, column)
+            self._dataVersions[key] = self._dataVersions.get(key, 0) + 1
+
+
+    def dataVersion(self, rowIdx, column):
+        '''
+        function returns the number of times the cell (rowIdx, column) has been
+        set through setData; it changes whenever the value of the cell is replaced
+        '''
+
+        return self._dataVersions.get((rowIdx, column), 0)
+
+
+    def setColumns(self, columns, additionalData=True):
+        '''
+        function sets the columns given by the dict columns (name: value or
+        sequence of values in the order of self.data()) for all rows at once
+        '''
+
+        self._data['rePro'] = self.id()
+        if additionalData:
+            self._data['additionalData'] = True
+
+        for name, values in columns.items():
+            self._data[name] = values
+            self._raggedColumns.pop(name, None)
+
+
+    def setDefaultToolConfig(self, signalAlias, config):
+        self._defaultToolConfigs[signalAlias] = config
+
+
+    def getToolConfig(self, series, signalAlias):
+        '''
+        function returns the signal tool configuration for the signal
+        with alias signalAlias in the row 'series'. A configuration stored
+        in the row itself overrides the default configuration of the RePro
+        '''
+
+        key = '%s_toolconfig' % signalAlias
+        if key in series.index and isinstance(series[key], dict):
+            return series[key]
+
+        return self._defaultToolConfigs.get(signalAlias)
+
+
+    def resetToolConfigs(self):
+        '''
+        function removes the signal tool configurations of all rows
+        (so that the RePro defaults apply) and flags all rows for re-evaluation
+        '''
+
+        for alias in self.signalAliases:
+            key = '%s_toolconfig' % alias
+            if key in self.data().columns:
+                self._data[key] = None
+
+        self._data['additionalData'] = False
+
 
     def loadReferenceData(self, refName, refAlias=None, useDelay=False):
         '''
@@ -151,7 +457,7 @@ class RePro():
         ref = self.getTagData().references[refName]
         tagStartIdx = tagEndIdx = int(self.getTagData().position[0]/si)
         tagEndIdx += int(self.getTagData().extent[0]/si)
-        refData = ref[:][tagStartIdx:tagEndIdx]
+        refData = np.asarray(ref[:][tagStartIdx:tagEndIdx], dtype=self.relacsFile.signalDtype)
         dim = getDimData(ref.dimensions[0])
 
         # if there is NO corresponding multiTag data: return data referenced in tag
@@ -167,6 +473,7 @@ class RePro():
                 name=posIdx
             )
 
+            self._referenceWindows[(posIdx, refAlias)] = (refName, tagStartIdx, tagEndIdx)
             self.setData(series, additionalData=False)
 
             return
@@ -204,9 +511,24 @@ class RePro():
                 name=posIdx
             )
 
+            self._referenceWindows[(posIdx, refAlias)] = (refName, tagStartIdx+mtStartIdx, tagStartIdx+mtEndIdx)
             self.setData(series, additionalData=False)
 
 
+    def rawSignal(self, rowIdx, alias):
+        '''
+        function reads the signal with alias alias of row rowIdx from the file
+        as stored there, i.e. without the signalDtype cast of loadReferenceData
+        returns None if the signal has not been loaded from the file
+        '''
+
+        if (rowIdx, alias) not in self._referenceWindows:
+            return None
+
+        refName, startIdx, endIdx = self._referenceWindows[(rowIdx, alias)]
+        return self.getTagData().references[refName][startIdx:endIdx]
+
+
     def loadMtFeatureData(self, featureName):
         # if there is no corresponding multiTag data: return data referenced in tag
         if self.getMtData() is None:
@@ -234,6 +556,31 @@ class RePro():
             )
             self.setData(series, additionalData=False)
 
+
+    def loadMtExtentData(self):
+        '''
+        function adds the extents of the multiTags as column duration [s],
+        i.e. the length of the windows loaded by loadReferenceData
+        '''
+
+        # if there is no corresponding multiTag data: there are no trials
+        if self.getMtData() is None:
+            return None
+
+        print('>Loading extents... (%s // %s)' % (self.relacsFile.filepath, self.id()))
+
+        si = self.getTagData().references[0].dimensions[0].sampling_interval
+        for idx in self.getMtIdcs():
+
+            posIdx = int(self.getMtData().positions[idx][0]/si)
+            series = pd.Series(
+                {
+                    'duration': self.getMtData().extents[idx][0]
+                },
+                name=posIdx
+            )
+            self.setData(series, additionalData=False)
+
 ################################################################
 # BASELINE ACTIVITY REPRO
 
@@ -286,6 +633,7 @@ class FICurveRePro(RePro):
 
     def loadSignals(self):
         self.loadMtFeatureData('delay')
+        self.loadMtExtentData()
         for signal, alias in zip(self.signalList, self.signalAliases):
             self.loadReferenceData(signal, alias, useDelay=True)
 
@@ -356,10 +704,12 @@ class RelacsFile():
     }
 
 
-    def __init__(self, filepath, savepath, savetype='json'):
+    def __init__(self, filepath, savepath, savetype='json', signalDtype=None):
         self.filepath = filepath
         self.savepath = savepath
         self.savetype = savetype
+        # dtype of loaded signal traces (None: as stored in the file)
+        self.signalDtype = signalDtype
         self._id = self.filepath.split(os.sep)[-1]
 
         # open .nix file and select block
@@ -452,9 +802,43 @@ class RelacsFile():
 
         print('Saving to %s...' % savename)
 
+        # derived columns are not stored
+        Df = Analysis.compactResults(Df)
+
         writefun(Df, savename)
 
 
+    def toolConfigSidecarName(self, savename):
+        return '%s.toolconfig.json' % os.path.splitext(savename)[0]
+
+
+    def openToolConfigFile(self, savename):
+        '''
+        function returns the default signal tool configurations (signal alias: config)
+        stored along with the save file savename
+        '''
+
+        filepath = self.toolConfigSidecarName(savename)
+        if not os.path.exists(filepath):
+            return dict()
+
+        with open(filepath, 'r') as fObj:
+            return json.load(fObj)
+
+
+    def writeToolConfigFile(self, configs, savename):
+        filepath = self.toolConfigSidecarName(savename)
+
+        configs = {alias: config for alias, config in configs.items() if config is not None}
+        if len(configs) == 0:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            return
+
+        with open(filepath, 'w') as fObj:
+            json.dump(configs, fObj, default=lambda val: val.item())
+
+
     def id(self):
         return self._id
 
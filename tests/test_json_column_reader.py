@@ -0,0 +1,60 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Base import JsonColumnReader
+
+
+@pytest.fixture
+def jsonFile(tmp_path):
+    # names and values with escaped quotes, backslashes and brackets inside strings
+    Df = pd.DataFrame(
+        {
+            'plain': [1.5, 2.5, None],
+            'quote"name': ['a"b', '"', '\\"'],
+            'bracket[{name': ['[', '{"x": [1]}', ']}'],
+            'backslash\\': ['\\', '\\\\', 'c:\\dir\\'],
+            'arrays': [[1, 2, 3], [], [[4], [5, 6]]],
+            'dicts': [{'"k"': '[v]'}, {'a': {'b': [1, '}']}}, None],
+        },
+        index=[10, 20, 30]
+    )
+    filepath = tmp_path / 'summary.json'
+    Df.to_json(filepath)
+    return str(filepath)
+
+
+@pytest.mark.parametrize('chunkSize', list(range(1, 41)) + [97, 2**24])
+def test_scan_columns_across_chunk_boundaries(jsonFile, chunkSize):
+    with open(jsonFile, 'r') as fObj:
+        expected = json.load(fObj)
+
+    reader = JsonColumnReader(jsonFile, chunkSize=chunkSize)
+    columns = list(reader.scanColumns())
+
+    assert [name for name, _ in columns] == list(expected.keys())
+    assert dict(columns) == {
+        'plain': False,
+        'quote"name': False,
+        'bracket[{name': False,
+        'backslash\\': False,
+        'arrays': True,
+        'dicts': True,
+    }
+
+    for name, values in expected.items():
+        column = reader.readColumn(name)
+        assert list(column.index) == [10, 20, 30]
+        assert json.loads(column.to_json()) == values
+
+
+def test_read_column_matches_read_json(jsonFile):
+    reader = JsonColumnReader(jsonFile, chunkSize=7)
+    for _ in reader.scanColumns():
+        pass
+
+    Df = pd.read_json(jsonFile)
+    column = reader.readColumn('plain')
+    assert np.allclose(column.values, Df['plain'].values, equal_nan=True)
@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('PyQt5')
+pytest.importorskip('pyqtgraph')
+pytest.importorskip('nixio')
+pytest.importorskip('thunderfish')
+
+import Analysis
+from Base import Config
+from CustomWidgets import SignalProcessor
+import nixlacs
+
+
+# recorded trace to run the comparison on (nix file path without extension)
+recordingPath = os.environ.get('NIXLACS_TEST_RECORDING')
+trialNum = 5
+
+
+@pytest.mark.skipif(recordingPath is None, reason='NIXLACS_TEST_RECORDING is not set')
+def test_float32_peaks_match_float64_reference(tmp_path):
+    rFile = nixlacs.RelacsFile(recordingPath, str(tmp_path), signalDtype=np.float32)
+
+    compared = 0
+    checkedClasses = list()
+    for rePro in rFile.rePros():
+        reProName = rePro.__class__.__name__
+        if reProName in checkedClasses:
+            continue
+
+        rePro.loadSignals()
+        if rePro.data().shape[0] == 0:
+            continue
+        checkedClasses.append(reProName)
+
+        signalProcessor = SignalProcessor(rePro, ui=False)
+        for posIdx in rePro.data().index[:trialNum]:
+            series = rePro.data(posIdx)
+            for alias, stype in zip(rePro.signalAliases, rePro.signalTypes):
+                if alias not in series.index or not isinstance(series[alias], np.ndarray):
+                    continue
+
+                signalData = signalProcessor.detectPeaks(series, alias, stype, np.float32)
+                refSignalData = signalProcessor.referencePeaks(series, alias, stype)
+
+                assert signalData.signal.dtype == np.float32
+                assert refSignalData.signal.dtype == np.float64
+
+                deviation = Analysis.unmatchedPeaks(signalData.tool.peakIndices, refSignalData.tool.peakIndices)
+                assert deviation <= Config.signalDtypeTolerance, (reProName, posIdx, alias, deviation)
+                compared += 1
+
+    rFile.close()
+
+    assert compared > 0
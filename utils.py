@@ -1,5 +1,11 @@
+import Analysis
+from Base import Config
+import collections
+import functools
 from IPython import embed
 import numpy as np
+import pandas as pd
+import traceback
 
 from PyQt5 import QtCore, QtWidgets
 
@@ -8,75 +14,591 @@ import pyqtgraph as pg
 pg.setConfigOptions(antialias=True)
 
 
+################################################################
+## BACKGROUND WORKERS
+
+class WorkerSignals(QtCore.QObject):
+
+    finished = QtCore.pyqtSignal(object)
+    error = QtCore.pyqtSignal(str)
+    # intermediate results
+    progress = QtCore.pyqtSignal(object)
+
+
+class Worker(QtCore.QRunnable):
+    '''
+    base class for work that is moved off the Qt main thread
+    subclasses must implement work(self), which is called from a pool thread;
+    its return value is delivered via signals.finished unless the worker
+    has been cancelled in the meantime (exceptions are delivered via signals.error)
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.signals = WorkerSignals()
+        self._cancelled = False
+
+
+    def cancel(self):
+        self._cancelled = True
+
+
+    def isCancelled(self):
+        return self._cancelled
+
+
+    def run(self):
+        if self.isCancelled():
+            return
+
+        try:
+            result = self.work()
+        except Exception as exc:
+            traceback.print_exc()
+            if not self.isCancelled():
+                self.signals.error.emit(str(exc))
+            return
+
+        if not self.isCancelled():
+            self.signals.finished.emit(result)
+
+
+def moveToMainThread(qObject):
+    '''
+    function hands a QObject that was created in a worker thread
+    over to the thread of the running Qt application (if there is one)
+    '''
+
+    app = QtCore.QCoreApplication.instance()
+    if app is None or qObject.thread() == app.thread():
+        return
+    qObject.moveToThread(app.thread())
+
+
+################################################################
+## UPDATE SCHEDULING
+
+class UpdateScheduler(QtCore.QObject):
+    '''
+    collects update requests for a target function and executes them coalesced:
+    all requests that arrive within one event loop turn result in a single
+    call target(sources) with the set of requested sources.
+    Signals are subscribed at most once per (emitter, source)
+
+    redraws are counted per user action (see beginAction)
+    '''
+
+    def __init__(self, target, name=''):
+        super().__init__()
+
+        self.target = target
+        self.name = name
+
+        self._pending = set()
+        self._scheduled = False
+        self._subscriptions = dict()
+
+        # instrumentation
+        self.action = None
+        self.redrawCounts = collections.Counter()
+
+
+    def subscribe(self, emitter, signal, source):
+        '''
+        function connects signal (of QObject emitter) to an update request for source
+        '''
+
+        key = (id(emitter), source)
+        if key in self._subscriptions:
+            return
+
+        slot = functools.partial(self.sourceChanged, source)
+        signal.connect(slot)
+        self._subscriptions[key] = (emitter, signal, slot)
+
+
+    def unsubscribeAll(self):
+        for emitter, signal, slot in self._subscriptions.values():
+            try:
+                signal.disconnect(slot)
+            except TypeError:
+                # emitter has been deleted in the meantime
+                pass
+        self._subscriptions = dict()
+
+
+    def request(self, source=None):
+        '''
+        function requests an update for source (None: everything)
+        '''
+
+        self._pending.add(source)
+        if self._scheduled:
+            return
+
+        self._scheduled = True
+        QtCore.QTimer.singleShot(0, self.flush)
+
+
+    def sourceChanged(self, source):
+        # a change that does not coincide with a pending update is a new user action
+        if not self._scheduled:
+            self.beginAction('update %s' % str(source))
+        self.request(source)
+
+
+    def flush(self):
+        self._scheduled = False
+        sources = self._pending
+        self._pending = set()
+        if len(sources) == 0:
+            return
+
+        self.redrawCounts[self.action] += 1
+        if Config.logRedraws:
+            print('Redraw %s (action: %s, redraw %i, sources: %s)' % (
+                self.name, self.action, self.redrawCounts[self.action], str(sorted(map(str, sources)))
+            ))
+
+        self.target(sources)
+
+
+    def beginAction(self, name):
+        '''
+        function starts a new user action; subsequent redraws are counted for it
+        '''
+
+        self.action = name
+        self.redrawCounts[name] = 0
+
+
+################################################################
+## CACHES
+
+class LRUCache():
+    '''
+    bounded dictionary that discards the least recently used entries
+    '''
+
+    def __init__(self, maxSize):
+        self.maxSize = maxSize
+        self._data = collections.OrderedDict()
+
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+    def __len__(self):
+        return len(self._data)
+
+
+    def get(self, key, default=None):
+        if key not in self._data:
+            return default
+
+        self._data.move_to_end(key)
+        return self._data[key]
+
+
+    def set(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxSize:
+            self._data.popitem(last=False)
+
+
+    def pop(self, key, default=None):
+        return self._data.pop(key, default)
+
+
+    def values(self):
+        return list(self._data.values())
+
+
+    def clear(self):
+        self._data.clear()
+
+
+################################################################
+## METADATA
+
+class ShowEventWidget(QtWidgets.QWidget):
+    '''
+    widget that emits sigFirstShown before it is shown for the first time,
+    so that its content can be built only when it is actually viewed,
+    and sigShown/sigHidden whenever it is shown or hidden
+    '''
+
+    sigFirstShown = QtCore.pyqtSignal()
+    sigShown = QtCore.pyqtSignal()
+    sigHidden = QtCore.pyqtSignal()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._shown = False
+
+
+    def showEvent(self, event):
+        if not self._shown:
+            self._shown = True
+            self.sigFirstShown.emit()
+        self.sigShown.emit()
+        super().showEvent(event)
+
+
+    def hideEvent(self, event):
+        self.sigHidden.emit()
+        super().hideEvent(event)
+
+
 class metadataTreeWidget():
+    '''
+    tree of odML metadata sections and properties
+    child sections and property values are only read from the file
+    when a section is expanded; the search box filters the flattened
+    metadata, which is read once on the first search
+    '''
 
     def __init__(self, metadata):
+        self.metadata = metadata
+        self._flatMetadata = None
+
         # setup layout
-        self.widget = QtWidgets.QTreeWidget()
+        self.widget = ShowEventWidget()
         self.widget.setLayout(QtWidgets.QVBoxLayout())
-        self.widget.setColumnCount(2)
-        self.widget.setHeaderLabels(['Label', 'Value'])
+        self.widget.sigFirstShown.connect(self.addTopLevelSections)
 
-        self.addMetadata(metadata)
+        self.searchInput = QtWidgets.QLineEdit()
+        self.searchInput.setPlaceholderText('Search metadata...')
+        self.searchInput.textChanged.connect(self.search)
+        self.widget.layout().addWidget(self.searchInput)
 
+        self.tree = QtWidgets.QTreeWidget()
+        self.tree.setColumnCount(2)
+        self.tree.setHeaderLabels(['Label', 'Value'])
+        self.tree.itemExpanded.connect(self.populateItem)
+        self.widget.layout().addWidget(self.tree)
 
-    def addMetadata(self, metadata):
+        self.searchResults = QtWidgets.QTreeWidget()
+        self.searchResults.setColumnCount(2)
+        self.searchResults.setHeaderLabels(['Path', 'Value'])
+        self.searchResults.setRootIsDecorated(False)
+        self.searchResults.hide()
+        self.widget.layout().addWidget(self.searchResults)
 
-        def buildTree(section):
-            secTree = QtWidgets.QTreeWidgetItem([section.name, ''])
-            for sec in section.sections:
-                secTree.addChild(buildTree(sec))
-            for prop in section.props:
-                secTree.addChild(QtWidgets.QTreeWidgetItem([prop.name, str(section[prop.name])]))
 
-            return secTree
-        
-        for section in metadata.sections:
-            self.widget.addTopLevelItem(buildTree(section))
+    def addTopLevelSections(self):
+        for section in self.metadata.sections:
+            self.tree.addTopLevelItem(self.sectionItem(section))
 
         # adjust column width
-        self.widget.resizeColumnToContents(0)
+        self.tree.resizeColumnToContents(0)
 
 
+    def sectionItem(self, section):
+        item = QtWidgets.QTreeWidgetItem([section.name, ''])
+        item.setChildIndicatorPolicy(QtWidgets.QTreeWidgetItem.ShowIndicator)
+        # section is kept on the item until the item is populated
+        item.setData(0, QtCore.Qt.UserRole, section)
 
-class CustomTableWidget(QtWidgets.QTableWidget):
+        return item
+
+
+    def populateItem(self, item):
+        section = item.data(0, QtCore.Qt.UserRole)
+        if section is None:
+            return
+        item.setData(0, QtCore.Qt.UserRole, None)
+
+        for sec in section.sections:
+            item.addChild(self.sectionItem(sec))
+        for prop in section.props:
+            item.addChild(QtWidgets.QTreeWidgetItem([prop.name, str(section[prop.name])]))
+
+        item.setChildIndicatorPolicy(QtWidgets.QTreeWidgetItem.DontShowIndicatorWhenChildless)
+
+
+    def flatMetadata(self):
+        '''
+        function returns all properties as list of (path, value, lower case search text)
+        '''
+
+        if self._flatMetadata is None:
+            self._flatMetadata = list()
+
+            def flatten(section, path):
+                for prop in section.props:
+                    propPath = '%s/%s' % (path, prop.name)
+                    value = str(section[prop.name])
+                    self._flatMetadata.append((propPath, value, ('%s %s' % (propPath, value)).lower()))
+                for sec in section.sections:
+                    flatten(sec, '%s/%s' % (path, sec.name))
+
+            for section in self.metadata.sections:
+                flatten(section, section.name)
+
+        return self._flatMetadata
+
+
+    def search(self, text, maxResults=1000):
+        text = text.strip().lower()
+        if text == '':
+            self.searchResults.hide()
+            self.tree.show()
+            return
+
+        self.searchResults.clear()
+        results = [
+            QtWidgets.QTreeWidgetItem([path, value]) for path, value, searchText in self.flatMetadata()
+            if text in searchText
+        ]
+        self.searchResults.addTopLevelItems(results[:maxResults])
+        self.searchResults.resizeColumnToContents(0)
+
+        self.tree.hide()
+        self.searchResults.show()
+
+
+class NotLoaded():
+    '''
+    placeholder for the cells of DataFrame columns that have not been loaded yet
+    '''
+
+
+def formatCell(val):
+    '''
+    function returns the display text of a DataFrame cell
+    (arrays are abbreviated to their first and last 10 values)
+    '''
+
+    if val is NotLoaded:
+        return 'Not loaded'
+
+    if isinstance(val, (list, np.ndarray)):
+        itemVal = 'Array(%i): ' % (len(val))
+        if len(val) > 50:
+            return itemVal + '[%s, ......, %s]' % (
+                ', '.join(map(str, val[:10])), ', '.join(map(str, val[-10:]))
+            )
+        return itemVal + str(list(val))
+
+    return '%s: %s' % (val.__class__.__name__, str(val))
+
+
+class DataFrameModel(QtCore.QAbstractTableModel):
+    '''
+    table model that displays a DataFrame without copying it:
+    cells are formatted only when they are displayed and the formatted
+    strings are kept in a bounded cache. Sorting and filtering reorder
+    the row positions of the DataFrame
+    '''
+
+    def __init__(self, Df=None, cacheSize=20000):
+        super().__init__()
+
+        self._cache = LRUCache(cacheSize)
+        self._filterExpr = ''
+        self._sortKey = None
+        self.setDataFrame(Df)
+
+
+    def setDataFrame(self, Df):
+        self.beginResetModel()
+        if Df is None:
+            Df = pd.DataFrame()
+        self._Df = Df
+        self._rows = np.arange(Df.shape[0])
+        self._cache.clear()
+        self.endResetModel()
+
+        self.setFilter(self._filterExpr)
+
+
+    def dataFrame(self):
+        '''
+        function returns the displayed (filtered and sorted) DataFrame
+        '''
+
+        return self._Df.iloc[self._rows]
+
+
+    def columnName(self, column):
+        return self._Df.columns[column]
+
+
+    def column(self, name):
+        '''
+        function returns the values of the column name (all rows)
+        or None if the column does not exist or has not been loaded
+        '''
+
+        if name not in self._Df.columns or not self.isLoaded(self._Df.columns.get_loc(name)):
+            return None
+        return self._Df[name]
+
+
+    def addColumns(self, columns):
+        '''
+        function appends columns (mapping of column names to Series or
+        None for columns that are not loaded yet) to the DataFrame;
+        the first columns that are added define the rows
+        '''
+
+        if len(columns) == 0:
+            return
+
+        if self._Df.shape[1] == 0:
+            index = [series.index for series in columns.values() if series is not None][0]
+            Df = pd.DataFrame(index=index)
+            for name, series in columns.items():
+                Df[name] = NotLoaded if series is None else series.values
+            self.setDataFrame(Df)
+            return
+
+        first = self._Df.shape[1]
+        self.beginInsertColumns(QtCore.QModelIndex(), first, first+len(columns)-1)
+        for name, series in columns.items():
+            self._Df[name] = NotLoaded if series is None else self._alignedValues(series)
+        self.endInsertColumns()
+
+
+    def setColumn(self, name, series):
+        '''
+        function replaces the values of an existing column
+        '''
+
+        column = self._Df.columns.get_loc(name)
+        self._Df[name] = self._alignedValues(series)
+        self._cache.clear()
+        self.dataChanged.emit(self.index(0, column), self.index(self.rowCount()-1, column))
+        self.headerDataChanged.emit(QtCore.Qt.Horizontal, column, column)
+
+
+    def isLoaded(self, column):
+        return self._Df.shape[0] == 0 or self._Df.iat[0, column] is not NotLoaded
+
+
+    def _alignedValues(self, series):
+        if series.index.equals(self._Df.index):
+            return series.values
+        return series.reindex(self._Df.index).values
+
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._rows.shape[0]
+
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._Df.shape[1]
+
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role != QtCore.Qt.DisplayRole:
+            return None
+
+        # cells are identified by their position in the DataFrame
+        key = (self._rows[index.row()], index.column())
+        text = self._cache.get(key)
+        if text is None:
+            text = formatCell(self._Df.iat[key])
+            self._cache.set(key, text)
+
+        return text
+
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+
+        if orientation == QtCore.Qt.Horizontal:
+            if not self.isLoaded(section):
+                return '%s (double-click to load)' % str(self._Df.columns[section])
+            return str(self._Df.columns[section])
+        return str(self._Df.index[self._rows[section]])
+
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        self._sortKey = (column, order)
+
+        self.layoutAboutToBeChanged.emit()
+        self._rows = self._sortedRows(self._rows)
+        self.layoutChanged.emit()
+
+
+    def _sortedRows(self, rows):
+        if self._sortKey is None or self._sortKey[0] < 0 or self._sortKey[0] >= self._Df.shape[1]:
+            return rows
+
+        column, sortOrder = self._sortKey
+        values = self._Df.iloc[rows, column]
+
+        # array cells are sorted by their length, everything else by value or text
+        if values.dtype == object:
+            values = values.apply(lambda val: len(val) if isinstance(val, (list, np.ndarray)) else val)
+            numeric = pd.to_numeric(values, errors='coerce')
+            if numeric.notna().sum() >= values.notna().sum():
+                values = numeric
+            else:
+                values = values.astype(str)
+
+        order = np.argsort(values.values, kind='stable')
+        if sortOrder != QtCore.Qt.AscendingOrder:
+            order = order[::-1]
+
+        return rows[order]
+
+
+    def setFilter(self, expression):
+        '''
+        function displays only the rows matching expression
+        (query string as in DataFrame.query; empty: all rows)
+        returns False if the expression is invalid
+        '''
+
+        self.beginResetModel()
+        self._filterExpr = expression
+        valid = True
+        rows = np.arange(self._Df.shape[0])
+        if expression.strip() != '':
+            try:
+                mask = self._Df.eval(expression)
+                rows = rows[np.asarray(mask, dtype=bool)]
+            except Exception as exc:
+                print('WARNING: Invalid filter expression \'%s\' (%s)' % (expression, str(exc)))
+                valid = False
+        self._rows = self._sortedRows(rows)
+        self.endResetModel()
+
+        return valid
+
+
+class CustomTableWidget(QtWidgets.QTableView):
 
     def __init__(self):
         super().__init__()
 
+        self.dfModel = DataFrameModel()
+        self.setModel(self.dfModel)
+        self.setSortingEnabled(True)
+        self.horizontalHeader().setSortIndicator(-1, QtCore.Qt.AscendingOrder)
+
 
     def buildFromDict(self, dictionary):
         pass
 
     
     def buildFromDf(self, Df):
-        self.clear()
-        
-        self.setRowCount(Df.shape[0])
-        self.setColumnCount(Df.shape[1])
-
-        setHHeader = True
-        for rIdx in range(Df.shape[0]):
-            self.setVerticalHeaderItem(rIdx, QtWidgets.QTableWidgetItem(str(Df.index[rIdx])))
-            for cIdx in range(Df.shape[1]):
-                if setHHeader:
-                    self.setHorizontalHeaderItem(cIdx, QtWidgets.QTableWidgetItem(str(Df.columns[cIdx])))
-                
-                # set value text for output 
-                val = Df.iloc[rIdx, cIdx]
-                if isinstance(val, (list, np.ndarray)):
-                    val = list(val)
-                    itemVal = 'Array(%i): ' % (len(val))
-                    if len(val) > 50:
-                        itemVal += str(val[:10]+['......']+val[-10:])
-                    else:
-                        val = str(val)
-                else:
-                    itemVal = '%s: %s' % (val.__class__.__name__, str(val))
-
-                # set item
-                self.setItem(rIdx, cIdx, QtWidgets.QTableWidgetItem(itemVal))
-            setHHEader = False
+        self.dfModel.setDataFrame(Df)
+
+
+    def setFilter(self, expression):
+        return self.dfModel.setFilter(expression)
             
 
 ################################################################
@@ -89,6 +611,13 @@ class FigureWidget(pg.PlotWidget):
 
     def plotMarkers(self, x, y, **kwargs):
         return self.plot(x, y, pen=None, symbol='o', symbolSize=6, **kwargs)
+
+    def plotHeatmap(self, **kwargs):
+        # image is drawn below all other plot items
+        imageItem = pg.ImageItem(**kwargs)
+        imageItem.setZValue(-1)
+        self.addItem(imageItem)
+        return imageItem
         
     
 class HistogramWidget(FigureWidget):
@@ -194,23 +723,19 @@ class PolarPlot(FigureWidget):
             
 
     def plotPhaseLock(self, periods, events):
-        phases = np.empty(periods.shape[1])
-        phases[:] = np.nan
-        for i, period in enumerate(periods.T):
-            evInPeriod = events[(events > period[0]) & (events < period[1])]
-            
-            if evInPeriod.shape[0] < 1:
-                continue
-            
-            phases[i] = (evInPeriod[0] - period[0]) / np.diff(period) 
+        result = Analysis.phaseLock(periods, events)
+        self.plotPhaseHistogram(result)
+
+        return result
 
-        phases = phases[np.logical_not(np.isnan(phases))]
 
-        counts, bins = np.histogram(phases, 10)
+    def plotPhaseHistogram(self, result):
+        counts = result['counts']
 
         if np.sum(counts) == 0:
             return
-        
-        centers = bins[:-1] + bins[1] - bins[0]
+
+        bins = result['bins']
+        centers = (bins[:-1] + bins[1:])/2
         self.plotFromCartesian(centers*2*np.pi, counts/np.sum(counts))
-        
+        self.setTitle('VS %.2f' % result['vectorStrength'])